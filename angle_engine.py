@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class AngleDefinition:
+    """
+    A joint angle measured at the second of three markers.
+
+    Attributes:
+    name (str): Angle type name, e.g. 'knee_r'. Output columns are '<name>_angle'.
+    markers (tuple): (marker1, marker2, marker3); the angle is calculated at marker2.
+    supplement (bool): Report 180 - angle instead of the angle itself.
+    """
+    name: str
+    markers: tuple
+    supplement: bool = False
+
+
+# Registry of angle definitions by name. Add to it with register_angle.
+ANGLE_REGISTRY = {}
+
+
+def register_angle(name, marker1, marker2, marker3, supplement=False, replace=False):
+    """
+    Add an angle definition to ANGLE_REGISTRY.
+
+    Parameters:
+    name (str): Angle type name.
+    marker1, marker2, marker3 (str): Marker names; the angle is calculated at marker2.
+    supplement (bool): Report 180 - angle, as test.py does for the foot angle.
+    replace (bool): Allow overwriting an existing definition of the same name.
+
+    Returns:
+    AngleDefinition: The registered definition.
+    """
+    if name in ANGLE_REGISTRY and not replace:
+        raise ValueError(f"Angle type already registered: {name}")
+    definition = AngleDefinition(name, (marker1, marker2, marker3), supplement)
+    ANGLE_REGISTRY[name] = definition
+    return definition
+
+
+# e.g. for 'shoulder', the angle is calculated at 'shoulder_r' between 'hip_r' and 'elbow_r'
+register_angle('shoulder', 'hip_r', 'shoulder_r', 'elbow_r')
+register_angle('knee_l', 'hip_l', 'knee_l', 'ankle_l')
+register_angle('elbow', 'shoulder_r', 'elbow_r', 'wrist_r')
+register_angle('wrist', 'elbow_r', 'wrist_r', 'elbow_r')
+register_angle('hip', 'shoulder_r', 'hip_r', 'knee_r')
+register_angle('knee_r', 'hip_r', 'knee_r', 'ankle_r')
+register_angle('ankle', 'knee_r', 'ankle_r', 'foot_r_6')
+register_angle('foot', 'ankle_r', 'foot_r_6', 'toes_r_6')
+register_angle('shoulder_l', 'hip_l', 'shoulder_l', 'elbow_l')
+register_angle('elbow_l', 'shoulder_l', 'elbow_l', 'wrist_l')
+register_angle('hip_l', 'shoulder_l', 'hip_l', 'knee_l')
+register_angle('ankle_180', 'knee_r', 'ankle_r', 'foot_r_6', supplement=True)
+
+
+def lookup_angles(angle_types):
+    """
+    Look up the AngleDefinition of each requested angle type.
+
+    Raises:
+    ValueError: Listing every angle type that is not registered.
+    """
+    unknown = [t for t in angle_types if t not in ANGLE_REGISTRY]
+    if unknown:
+        raise ValueError(f"Invalid angle type: {', '.join(unknown)}")
+    return [ANGLE_REGISTRY[t] for t in angle_types]
+
+
+def validate_angles(angle_types, marker_index):
+    """
+    Check every requested angle type against the registry and a marker index
+    before any computation starts.
+
+    Parameters:
+    angle_types (list of str): Keys of ANGLE_REGISTRY.
+    marker_index (dict): Marker name -> slot (TRCTrial.marker_index) or the
+        dict from swiri_processing.extract_marker_indices.
+
+    Returns:
+    list: The AngleDefinition of each requested angle type.
+
+    Raises:
+    ValueError: Listing every unknown angle type and every missing marker.
+    """
+    definitions = lookup_angles(angle_types)
+    missing = {}
+    for definition in definitions:
+        absent = [m for m in definition.markers if m not in marker_index]
+        if absent:
+            missing[definition.name] = absent
+    if missing:
+        details = '; '.join(f"{name}: {', '.join(markers)}" for name, markers in missing.items())
+        raise ValueError(f"Markers missing for angle types: {details}")
+    return definitions
+
+
+def batch_angles(a, b, c):
+    """
+    Vectorized calculate_angle: the angle at b between a and c for every row.
+
+    Parameters:
+    a, b, c (ndarray): Point coordinates shaped (..., 3). Leading dimensions
+        broadcast, so (frames, 3) and (frames, angles, 3) both work.
+
+    Returns:
+    ndarray: Angles in degrees shaped like the leading dimensions.
+    """
+    ba = np.asarray(a, dtype=np.float64) - b
+    bc = np.asarray(c, dtype=np.float64) - b
+    dot = np.einsum('...i,...i->...', ba, bc)
+    norms = np.sqrt(np.einsum('...i,...i->...', ba, ba) * np.einsum('...i,...i->...', bc, bc))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine_angle = dot / norms
+    # Clip to avoid NaN due to floating point errors
+    return np.degrees(np.arccos(np.clip(cosine_angle, -1.0, 1.0)))
+
+
+def angle_slots(marker_index, definitions):
+    """
+    Slot indices of the (marker1, marker2, marker3) triple of every definition,
+    as three int arrays, plus a boolean mask of the supplement definitions.
+    """
+    triples = np.array([[marker_index[m] for m in d.markers] for d in definitions], dtype=np.intp)
+    supplement = np.array([d.supplement for d in definitions], dtype=bool)
+    return triples[:, 0], triples[:, 1], triples[:, 2], supplement
+
+
+def apply_supplement(angles, supplement):
+    """
+    Replace the angles of supplement definitions (last axis) by 180 - angle.
+    """
+    if supplement.any():
+        angles[..., supplement] = 180 - angles[..., supplement]
+    return angles
+
+
+def compute_angles(trial, angle_types):
+    """
+    Calculate every requested angle for every frame of a trial in one batch.
+
+    Parameters:
+    trial (TRCTrial): Parsed trial from trc_reader.read_trc.
+    angle_types (list of str): Keys of ANGLE_REGISTRY.
+
+    Returns:
+    DataFrame: One row per frame, a 'time' column and one '<angle_type>_angle'
+    column per requested angle.
+    """
+    definitions = validate_angles(angle_types, trial.marker_index)
+    p, v, d, supplement = angle_slots(trial.marker_index, definitions)
+    angles = batch_angles(trial.data[:, p, :], trial.data[:, v, :], trial.data[:, d, :])
+    angles = apply_supplement(angles, supplement)
+    table = pd.DataFrame(angles, columns=[f'{t}_angle' for t in angle_types])
+    table.insert(0, 'time', trial.time)
+    return table
+
+
+def compute_angles_stack(trials, angle_types, names=None):
+    """
+    Calculate angles across a stack of trials at once.
+
+    The needed markers of every trial are gathered into one
+    (total frames, markers, 3) array so all angles of all trials are computed
+    in a single batch_angles call.
+
+    Parameters:
+    trials (list of TRCTrial): Parsed trials; they may differ in length and
+        marker order.
+    angle_types (list of str): Keys of ANGLE_REGISTRY.
+    names (list of str): Label for each trial. Defaults to the trial paths.
+
+    Returns:
+    DataFrame: Tidy table with 'trial', 'frame', 'time' and one
+    '<angle_type>_angle' column per requested angle.
+    """
+    # Validate every trial up front so a bad trial fails before any computation
+    definitions = lookup_angles(angle_types)
+    for trial in trials:
+        validate_angles(angle_types, trial.marker_index)
+    if names is None:
+        names = [trial.path for trial in trials]
+    needed = list(dict.fromkeys(m for d in definitions for m in d.markers))
+    needed_index = {m: i for i, m in enumerate(needed)}
+
+    gathered = np.concatenate([
+        trial.data[:, [trial.marker_index[m] for m in needed], :] for trial in trials
+    ]) if trials else np.empty((0, len(needed), 3))
+    p, v, d, supplement = angle_slots(needed_index, definitions)
+    angles = batch_angles(gathered[:, p, :], gathered[:, v, :], gathered[:, d, :])
+    angles = apply_supplement(angles, supplement)
+
+    lengths = [trial.n_frames for trial in trials]
+    table = pd.DataFrame(angles, columns=[f'{t}_angle' for t in angle_types])
+    table.insert(0, 'time', np.concatenate([trial.time for trial in trials]) if trials else [])
+    table.insert(0, 'frame', np.concatenate([np.arange(n) for n in lengths]) if trials else [])
+    table.insert(0, 'trial', np.repeat(names, lengths))
+    return table
+
+
+def compute_subject_angles(trial, angle_types, workers=None):
+    """
+    Calculate angles for every person of a multi-subject capture in parallel.
+
+    Subjects are views into the trial's marker array (TRCTrial.subjects), so
+    they are processed on threads that share it rather than copied into
+    worker processes.
+
+    Parameters:
+    trial (TRCTrial): Parsed trial, with one or more marker sets.
+    angle_types (list of str): Keys of ANGLE_REGISTRY.
+    workers (int): Threads. Defaults to one per subject.
+
+    Returns:
+    dict: Subject label (None for a single-subject trial) -> angle table
+    from compute_angles.
+    """
+    subjects = trial.subjects()
+    if len(subjects) == 1:
+        return {subjects[0].subject: compute_angles(subjects[0], angle_types)}
+    with ThreadPoolExecutor(max_workers=workers or len(subjects)) as executor:
+        tables = executor.map(lambda subject: compute_angles(subject, angle_types), subjects)
+        return {subject.subject: table for subject, table in zip(subjects, tables)}
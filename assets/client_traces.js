@@ -0,0 +1,94 @@
+// Clientside trace toggling for the Dash app (internal_sandbox.py, CLIENT_TRACES=1).
+// The columns of every selected trial arrive once as packed float32 arrays in
+// the 'trial-columns' store. The figure is then built in the browser with one
+// trace per (file, metric) of the selected files, and metric checkboxes only
+// flip trace visibility; the server is asked for data only when a file that
+// was never loaded is selected.
+window.dash_clientside = window.dash_clientside || {};
+
+(function () {
+    var cache = {};
+
+    function decode(spec) {
+        var raw = atob(spec.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return new Float32Array(bytes.buffer);
+    }
+
+    // Per-file time, cycle-percent and column arrays, decoded once per payload.
+    // Reusing the same arrays across renders lets Plotly.react skip unchanged data.
+    function trial(fname, packed) {
+        var entry = cache[fname];
+        if (!entry || entry.source !== packed) {
+            var time = decode(packed.time);
+            var values = decode(packed.values);
+            var n = packed.n, m = packed.columns.length;
+            var t0 = time[0], t1 = time[n - 1];
+            var cycle = new Float32Array(n);
+            var columns = {};
+            packed.columns.forEach(function (name, j) {
+                var column = new Float32Array(n);
+                for (var i = 0; i < n; i++) {
+                    column[i] = values[i * m + j];
+                }
+                columns[name] = column;
+            });
+            for (var i = 0; i < n; i++) {
+                cycle[i] = t1 > t0 ? 100 * (time[i] - t0) / (t1 - t0) : 0;
+            }
+            entry = cache[fname] = {source: packed, time: time, cycle: cycle, columns: columns};
+        }
+        return entry;
+    }
+
+    window.dash_clientside.traces = {
+        // Ask the server only for selected files whose columns are not loaded yet
+        request: function (selected, loaded) {
+            loaded = loaded || {};
+            var missing = (selected || []).filter(function (f) { return !loaded[f]; });
+            return missing.length ? missing : window.dash_clientside.no_update;
+        },
+
+        // Arguments: selected files, one value list per metric group, time
+        // mode, loaded columns, config ({layout, gl_threshold})
+        render: function () {
+            var args = Array.prototype.slice.call(arguments);
+            var selected = args[0] || [];
+            var config = args[args.length - 1];
+            var loaded = args[args.length - 2] || {};
+            var timeMode = args[args.length - 3];
+            var shown = {};
+            args.slice(1, args.length - 3).forEach(function (group) {
+                (group || []).forEach(function (metric) { shown[metric] = true; });
+            });
+
+            var layout = Object.assign({}, config.layout);
+            if (timeMode === 'cycle') {
+                layout.xaxis = Object.assign({}, layout.xaxis, {title: {text: 'Cycle (%)'}});
+                layout.uirevision = 'kinematic-plot-cycle';
+            }
+            var data = [];
+            selected.forEach(function (fname) {
+                if (!loaded[fname]) {
+                    return;
+                }
+                var t = trial(fname, loaded[fname]);
+                var x = timeMode === 'cycle' ? t.cycle : t.time;
+                loaded[fname].columns.forEach(function (metric) {
+                    data.push({
+                        type: x.length > config.gl_threshold ? 'scattergl' : 'scatter',
+                        mode: 'lines',
+                        name: metric + ' - ' + fname,
+                        x: x,
+                        y: t.columns[metric],
+                        visible: !!shown[metric]
+                    });
+                });
+            });
+            return {data: data, layout: layout};
+        }
+    };
+})();
@@ -0,0 +1,127 @@
+// Clientside playback for the Dash app (internal_sandbox.py).
+// The playback trial arrives once as packed float32 arrays in the
+// 'playback-data' store; everything below runs in the browser, so moving the
+// cursor never calls the server.
+window.dash_clientside = window.dash_clientside || {};
+
+(function () {
+    var decoded = {source: null};
+
+    function decode(spec) {
+        var raw = atob(spec.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return new Float32Array(bytes.buffer);
+    }
+
+    // Decoded arrays of the current playback trial, decoded once per payload
+    function trial(data) {
+        if (decoded.source !== data) {
+            decoded = {source: data, time: decode(data.time), values: decode(data.values)};
+        }
+        return decoded;
+    }
+
+    // First frame whose time is at or after t
+    function frameAt(time, t) {
+        var lo = 0, hi = time.length - 1;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (time[mid] < t) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    // Vertical cursor drawn as a plain div over the plot area, so moving it
+    // does not emit plotly relayout events (which would reach the server)
+    function drawCursor(gd, x) {
+        var layout = gd._fullLayout;
+        if (!layout || !layout.xaxis) {
+            return;
+        }
+        var line = gd.querySelector('.playback-cursor');
+        if (!line) {
+            line = document.createElement('div');
+            line.className = 'playback-cursor';
+            line.style.cssText = 'position:absolute;width:0;border-left:2px solid #d62728;pointer-events:none;z-index:10;';
+            gd.style.position = 'relative';
+            gd.appendChild(line);
+            // Keep the cursor in place when the plot is redrawn, zoomed or resized
+            gd.on('plotly_afterplot', function () { drawCursor(gd, gd._playbackX); });
+        }
+        gd._playbackX = x;
+        var xa = layout.xaxis, ya = layout.yaxis;
+        var px = x === null || x === undefined ? NaN : xa.l2p(x);
+        if (!isFinite(px) || px < 0 || px > xa._length) {
+            line.style.display = 'none';
+            return;
+        }
+        line.style.display = 'block';
+        line.style.left = (xa._offset + px) + 'px';
+        line.style.top = ya._offset + 'px';
+        line.style.height = ya._length + 'px';
+    }
+
+    window.dash_clientside.playback = {
+        // Playback trial choices follow the file selection
+        files: function (selected, current) {
+            selected = selected || [];
+            var options = selected.map(function (f) { return {label: f, value: f}; });
+            var value = selected.indexOf(current) >= 0 ? current : (selected.length ? selected[0] : null);
+            return [options, value];
+        },
+
+        toggle: function (nClicks, disabled) {
+            if (!nClicks) {
+                return [true, 'Play'];
+            }
+            return [!disabled, disabled ? 'Pause' : 'Play'];
+        },
+
+        // Advance by the wall time of one interval tick, wrapping at the end
+        advance: function (nIntervals, frame, interval, data) {
+            if (!data || !data.n) {
+                return window.dash_clientside.no_update;
+            }
+            var time = trial(data).time;
+            frame = Math.min(frame || 0, time.length - 1);
+            if (frame >= time.length - 1) {
+                return 0;
+            }
+            var target = time[frame] + interval / 1000;
+            var next = frameAt(time, target);
+            if (next > 0 && target - time[next - 1] < time[next] - target) {
+                next -= 1;
+            }
+            return Math.max(next, frame + 1);
+        },
+
+        // Move the cursor on every synced graph and show the pose at the frame
+        seek: function (frame, data, timeMode, figure) {
+            if (!data || !data.n) {
+                document.querySelectorAll('.playback-synced .js-plotly-plot').forEach(function (gd) {
+                    drawCursor(gd, null);
+                });
+                return ['', ''];
+            }
+            var d = trial(data);
+            frame = Math.min(frame || 0, data.n - 1);
+            var t = d.time[frame];
+            var x = t;
+            if (timeMode === 'cycle') {
+                var t0 = d.time[0], t1 = d.time[data.n - 1];
+                x = t1 > t0 ? 100 * (t - t0) / (t1 - t0) : 0;
+            }
+            document.querySelectorAll('.playback-synced .js-plotly-plot').forEach(function (gd) {
+                drawCursor(gd, x);
+            });
+            var n = data.columns.length;
+            var pose = data.columns.map(function (name, i) {
+                return name + ' = ' + d.values[frame * n + i].toFixed(3);
+            }).join('\n');
+            return ['t = ' + t.toFixed(3) + ' s (frame ' + (frame + 1) + '/' + data.n + ')', pose];
+        }
+    };
+})();
@@ -0,0 +1,353 @@
+"""
+Headless batch processing of TRC trials.
+
+Parses, cleans and computes joint angles for every TRC file found, fanned
+out over a process pool, writes one angle table per trial and optionally
+PNG/HTML figures and OpenSim .sto angle files, and prints a run summary.
+Nothing opens a window, so it can run on a server or from cron.
+
+Runs are incremental: a manifest in the output directory records the
+content hash of every processed trial and of the settings, and only new or
+changed trials are processed again. --watch keeps polling the inputs, so
+captures dropped into TRCfiles/ show up as angle .sto files in STOfiles/.
+
+Example:
+    python batch_pipeline.py TRCfiles --out angle_tables --png --workers 4
+    python batch_pipeline.py "TRCfiles/*squat.trc" --angles knee_r knee_l
+    python batch_pipeline.py TRCfiles --sto-out STOfiles --watch
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_ANGLES = ['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle', 'knee_l']
+# Per-output-directory record of processed trials
+MANIFEST_NAME = '.batch_manifest.json'
+
+
+def find_trials(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of .trc paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '*.trc')))
+        else:
+            paths.update(p for p in glob.glob(item) if p.lower().endswith('.trc'))
+    return sorted(paths)
+
+
+def render_png(table, angle_types, title, path):
+    """
+    Render the angle curves of one trial to a PNG off-screen.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from downsample import minmax_downsample
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    for angle_type in angle_types:
+        x, y = minmax_downsample(table['time'].to_numpy(), table[f'{angle_type}_angle'].to_numpy())
+        ax.plot(x, y, label=f'{angle_type} angle')
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Angle (degrees)')
+    ax.set_title(title)
+    ax.legend()
+    ax.grid()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+
+
+def render_html(table, angle_types, title, path):
+    """
+    Write the angle curves of one trial as a standalone plotly HTML page.
+    """
+    import plotly.graph_objs as go
+    from downsample import minmax_downsample
+
+    fig = go.Figure()
+    for angle_type in angle_types:
+        x, y = minmax_downsample(table['time'].to_numpy(), table[f'{angle_type}_angle'].to_numpy())
+        fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=f'{angle_type} angle'))
+    fig.update_layout(title=title, xaxis_title='Time (s)', yaxis_title='Angle (degrees)')
+    fig.write_html(path, include_plotlyjs='cdn')
+
+
+def process_trial(path, angle_types, out_dir, png=False, html=False, use_cache=False, segments=False,
+                  filtered=False, sto_dir=None):
+    """
+    Parse one TRC file, compute its angles and write the outputs.
+
+    Returns:
+    dict: Summary of the trial (path, frames, seconds, outputs, error, and
+    skipped: outputs that could not be produced for this trial).
+    """
+    from angle_engine import compute_subject_angles
+
+    start = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    summary = {'path': path, 'frames': 0, 'seconds': 0.0, 'outputs': [], 'error': None, 'skipped': []}
+    try:
+        if use_cache and filtered:
+            from marker_filtering import load_filtered
+            trial = load_filtered(path)
+        elif use_cache:
+            from trial_cache import load_trc
+            trial = load_trc(path)
+        else:
+            from trc_reader import read_trc
+            trial = read_trc(path)
+            if filtered:
+                from marker_filtering import filter_trial
+                trial = filter_trial(trial)
+        # Captures with several people get one set of outputs per subject
+        tables = compute_subject_angles(trial, angle_types)
+        summary['frames'] = trial.n_frames
+
+        for subject, table in tables.items():
+            name = stem if subject is None else f'{stem}_{subject}'
+            table_path = os.path.join(out_dir, f'{name}_angles.csv')
+            table.to_csv(table_path, index_label='frame')
+            summary['outputs'].append(table_path)
+            if sto_dir:
+                from trial_writer import write_sto
+                sto_path = os.path.join(sto_dir, f'{name}_angles.sto')
+                write_sto(sto_path, table, name='Angles')
+                summary['outputs'].append(sto_path)
+            if png:
+                png_path = os.path.join(out_dir, f'{name}_angles.png')
+                render_png(table, angle_types, f'Joint Angles Over Time - {name}', png_path)
+                summary['outputs'].append(png_path)
+            if html:
+                html_path = os.path.join(out_dir, f'{name}_angles.html')
+                render_html(table, angle_types, f'Joint Angles Over Time - {name}', html_path)
+                summary['outputs'].append(html_path)
+        if segments:
+            import pandas as pd
+            from segmentation import SEGMENT_SETTINGS, load_segments, movement_of, segment_subjects
+            movement = movement_of(path)
+            indices = {}
+            if movement is not None:
+                try:
+                    if len(tables) > 1 and SEGMENT_SETTINGS[movement]['source'] == 'trc':
+                        indices = {f'{stem}_{subject}': index for subject, index in segment_subjects(trial).items()}
+                    else:
+                        indices = {stem: load_segments(path)}
+                except LookupError as exc:  # e.g. no STO with the segmentation signal
+                    summary['skipped'].append(f'segments ({exc})')
+            for name, index in indices.items():
+                segments_path = os.path.join(out_dir, f'{name}_segments.csv')
+                pd.DataFrame(index).to_csv(segments_path, index_label='rep')
+                summary['outputs'].append(segments_path)
+    except Exception as exc:  # report the failure and keep the batch going
+        summary['error'] = f'{type(exc).__name__}: {exc}'
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _process_args(args):
+    return process_trial(*args)
+
+
+def run_batch(paths, angle_types, out_dir, workers=None, chunksize=1, png=False, html=False, use_cache=False,
+              segments=False, filtered=False, sto_dir=None):
+    """
+    Process TRC files over a process pool.
+
+    Parameters:
+    paths (list): TRC file paths.
+    angle_types (list of str): Angle types to compute (keys of angle_engine.ANGLE_REGISTRY).
+    out_dir (str): Directory for the angle tables and figures.
+    workers (int): Worker processes. Defaults to the number of CPUs; 1 runs in-process.
+    chunksize (int): Trials handed to a worker at a time.
+    png, html (bool): Also render figures.
+    use_cache (bool): Load trials through trial_cache.
+    segments (bool): Also write the rep/stride segment index of each trial.
+    filtered (bool): Gap-fill and low-pass the markers first (see marker_filtering).
+    sto_dir (str): Also write each angle table as '<trial>_angles.sto' here.
+
+    Returns:
+    list: One summary dict per trial, in input order.
+    """
+    from angle_engine import lookup_angles
+
+    lookup_angles(angle_types)  # fail on unknown angle types before starting workers
+    os.makedirs(out_dir, exist_ok=True)
+    if sto_dir:
+        os.makedirs(sto_dir, exist_ok=True)
+    tasks = [(path, angle_types, out_dir, png, html, use_cache, segments, filtered, sto_dir)
+             for path in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        return [_process_args(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_process_args, tasks, chunksize=max(chunksize, 1)))
+
+
+def settings_digest(**settings):
+    """
+    Hash of the settings that shape a trial's outputs, including the marker
+    filter settings when filtering is on.
+    """
+    if settings.get('filtered'):
+        from marker_filtering import DEFAULT_FILTER, FILTER_OVERRIDES
+        settings['filter_settings'] = [DEFAULT_FILTER, FILTER_OVERRIDES]
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def stale_trials(paths, manifest, settings):
+    """
+    Trials that are new, or whose content or settings changed since they were
+    last processed successfully. The content hash is only computed when a
+    file's size or mtime differs from the manifest (touched or copied files
+    with the same content are not reprocessed).
+
+    Returns:
+    list: (path, stat dict) of every stale trial.
+    """
+    from trial_cache import file_digest
+
+    stale = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = manifest.get(os.path.abspath(path))
+        current = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if entry is not None and entry['settings'] == settings:
+            if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                continue
+            digest = file_digest(path)
+            if entry['size'] == stat.st_size and entry['digest'] == digest:
+                entry.update(current)
+                continue
+            current['digest'] = digest
+        stale.append((path, current))
+    return stale
+
+
+def run_incremental(paths, angle_types, out_dir, force=False, **batch_kwargs):
+    """
+    run_batch over only the new or changed trials, recording successes in
+    the output directory's manifest.
+
+    Parameters:
+    paths (list): TRC file paths.
+    angle_types (list of str): Angle types to compute.
+    out_dir (str): Output directory (holds the manifest).
+    force (bool): Process every trial regardless of the manifest.
+    batch_kwargs: Passed to run_batch (workers, png, sto_dir, ...).
+
+    Returns:
+    list: Summaries of the trials processed (empty when nothing changed).
+    """
+    from trial_cache import file_digest
+
+    os.makedirs(out_dir, exist_ok=True)
+    settings = settings_digest(angle_types=angle_types, **{k: v for k, v in batch_kwargs.items()
+                                                          if k not in ('workers', 'chunksize')})
+    manifest = {} if force else load_manifest(out_dir)
+    stale = stale_trials(paths, manifest, settings)
+    summaries = run_batch([path for path, _ in stale], angle_types, out_dir, **batch_kwargs) if stale else []
+    for (path, current), summary in zip(stale, summaries):
+        if summary['error'] is None:
+            manifest[os.path.abspath(path)] = {
+                **current,
+                'digest': current.get('digest') or file_digest(path),
+                'settings': settings,
+                'outputs': summary['outputs'],
+            }
+    save_manifest(out_dir, manifest)
+    return summaries
+
+
+def watch(inputs, angle_types, out_dir, interval=5.0, force=False, **kwargs):
+    """
+    Poll the inputs every `interval` seconds and process new or changed
+    trials as they appear, until interrupted. force applies to the first
+    pass only.
+    """
+    print(f"Watching {', '.join(inputs)} every {interval:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            start = time.perf_counter()
+            summaries = run_incremental(find_trials(inputs), angle_types, out_dir, force=force, **kwargs)
+            force = False
+            if summaries:
+                print_summary(summaries, time.perf_counter() - start)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def print_summary(summaries, wall_seconds, stream=sys.stdout):
+    """
+    Print one line per trial and the run totals.
+    """
+    for s in summaries:
+        status = 'ok' if s['error'] is None else f"FAILED {s['error']}"
+        if s.get('skipped'):
+            status += f" (skipped {'; '.join(s['skipped'])})"
+        print(f"{s['path']}: {s['frames']} frames in {s['seconds']:.3f}s {status}", file=stream)
+    frames = sum(s['frames'] for s in summaries)
+    failed = sum(s['error'] is not None for s in summaries)
+    rate = frames / wall_seconds if wall_seconds > 0 else 0.0
+    print(f"{len(summaries)} trials ({failed} failed), {frames} frames in {wall_seconds:.2f}s "
+          f"({rate:.0f} frames/s)", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute joint angles for directories of TRC trials.')
+    parser.add_argument('inputs', nargs='+', help='TRC files, directories or glob patterns')
+    parser.add_argument('--angles', nargs='+', default=DEFAULT_ANGLES, help='angle types to compute')
+    parser.add_argument('--out', default='angle_tables', help='output directory')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=1, help='trials per worker task')
+    parser.add_argument('--png', action='store_true', help='render a PNG figure per trial')
+    parser.add_argument('--html', action='store_true', help='write an HTML figure per trial')
+    parser.add_argument('--cache', action='store_true', help='load trials through the binary trial cache')
+    parser.add_argument('--segments', action='store_true', help='write the rep/stride segment index per trial')
+    parser.add_argument('--filter', action='store_true', help='gap-fill and low-pass the markers before computing angles')
+    parser.add_argument('--sto-out', default=None, help='also write angle .sto files here (e.g. STOfiles)')
+    parser.add_argument('--force', action='store_true', help='reprocess every trial, ignoring the manifest')
+    parser.add_argument('--watch', action='store_true', help='keep polling the inputs for new or changed trials')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between polls in --watch mode')
+    args = parser.parse_args(argv)
+
+    batch_kwargs = dict(workers=args.workers, chunksize=args.chunksize, png=args.png, html=args.html,
+                        use_cache=args.cache, segments=args.segments, filtered=args.filter, sto_dir=args.sto_out)
+    if args.watch:
+        watch(args.inputs, args.angles, args.out, args.interval, force=args.force, **batch_kwargs)
+        return 0
+    paths = find_trials(args.inputs)
+    if not paths:
+        parser.error('no .trc files found')
+    start = time.perf_counter()
+    summaries = run_incremental(paths, args.angles, args.out, force=args.force, **batch_kwargs)
+    print_summary(summaries, time.perf_counter() - start)
+    return 1 if any(s['error'] for s in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Benchmarks for the parsing, angle and dashboard stages.
+
+Runs every stage against the bundled TRCfiles/STOfiles and against
+synthetic TRC trials, records wall time, peak traced memory and frames/s,
+writes the results as JSON and optionally compares them with a stored
+baseline. Runs offline; the dashboard stage is skipped if dash is missing.
+
+Example:
+    python benchmark.py --out bench.json
+    python benchmark.py --synthetic 10000x85 100000x500 --repeat 5
+    python benchmark.py --baseline bench_baseline.json --threshold 0.2
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+ANGLES = ['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle', 'knee_l']
+# Markers the default angle definitions need, placed first in synthetic trials
+SYNTHETIC_MARKERS = ['shoulder_r', 'elbow_r', 'wrist_r', 'hip_r', 'knee_r', 'ankle_r', 'foot_r_6',
+                     'hip_l', 'knee_l', 'ankle_l']
+
+
+def write_synthetic_trc(path, n_frames, n_markers, rate=100.0, seed=0):
+    """
+    Write a TRC file of n_frames x n_markers smooth random trajectories.
+    """
+    rng = np.random.default_rng(seed)
+    names = (SYNTHETIC_MARKERS + [f'marker_{i}' for i in range(n_markers)])[:n_markers]
+    time_s = np.arange(1, n_frames + 1) / rate
+    phases = rng.uniform(0, 2 * np.pi, size=(1, n_markers * 3))
+    offsets = rng.uniform(-1000, 1000, size=(1, n_markers * 3))
+    coords = offsets + 100 * np.sin(2 * np.pi * 0.5 * time_s[:, None] + phases)
+    with open(path, 'w', newline='') as f:
+        f.write(f'PathFileType\t3\t(X/Y/Z)\t{os.path.basename(path)}\r\n')
+        f.write('DataRate\tCameraRate\tNumFrames\tNumMarkers\tUnits\tOrigDataRate\tOrigDataStartFrame\tOrigNumFrames\r\n')
+        f.write(f'{rate}\t{rate}\t{n_frames}\t{n_markers}\tmm\t{rate}\t1\t{n_frames}\r\n')
+        f.write('Frame#\tTime\t' + ''.join(f'{name}\t\t\t' for name in names) + '\r\n')
+        f.write('\t\t' + ''.join(f'X{i}\tY{i}\tZ{i}\t' for i in range(1, n_markers + 1)) + '\r\n')
+        block = np.column_stack([np.arange(1, n_frames + 1), time_s, coords])
+        np.savetxt(f, block, fmt=['%d', '%.6f'] + ['%.6f'] * (n_markers * 3), delimiter='\t', newline='\t\r\n')
+    return path
+
+
+def measure(func, repeat):
+    """
+    Run func `repeat` times. Returns (median seconds, peak traced bytes, result).
+    The peak is taken from an extra traced run so tracing does not skew timings.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak, result
+
+
+def trc_stages(paths):
+    """
+    (stage name, callable) pairs for a set of TRC files.
+    """
+    import swiri_processing as sp
+    from angle_engine import compute_angles_stack
+    from trc_reader import read_trc_files
+
+    raw = sp.read_in_files(paths)
+    cleaned = sp.clip_and_clean(sp.read_in_files(paths))
+    trials = read_trc_files(paths)
+
+    def clip_and_clean():
+        return sp.clip_and_clean([df.copy() for df in raw])
+
+    def calculate_joint_angles():
+        return [sp.calculate_joint_angles(df.copy(), ANGLES) for df in cleaned]
+
+    return [
+        ('read_in_files', lambda: sp.read_in_files(paths)),
+        ('clip_and_clean', clip_and_clean),
+        ('calculate_joint_angles', calculate_joint_angles),
+        ('trc_reader.read_trc', lambda: read_trc_files(paths)),
+        ('angle_engine.compute_angles_stack', lambda: compute_angles_stack(trials, ANGLES)),
+    ]
+
+
+def sto_stages(paths):
+    import sto_processing
+
+    return [('sto_processing.process_files', lambda: sto_processing.process_files(paths))]
+
+
+def dashboard_stages(sto_names, metrics, cache_dir):
+    """
+    update_plot as a full initial render through the Dash test client. Trace
+    caches warm up on the first run, so the median reflects repeat renders.
+    """
+    try:
+        import trial_cache
+        trial_cache.CACHE_DIR = cache_dir
+        import internal_sandbox
+    except ImportError as exc:
+        print(f"skipping dashboard stage: {exc}", file=sys.stderr)
+        return []
+    client = internal_sandbox.app.server.test_client()
+    client.get('/')
+    # Build the request from the registered callback, so its input list can change
+    # without breaking the benchmark; inputs not listed here are sent as None
+    output, spec = next((key, spec) for key, spec in internal_sandbox.app.callback_map.items()
+                        if 'kinematic-plot.figure' in key)
+    group_ids = {f'{g.lower()}-metrics': g for g in internal_sandbox.metric_groups}
+    values = {'file-checklist': sto_names, 'time-mode': 'raw', 'plot-view': 'traces'}
+
+    def value(item):
+        if item['id'] in group_ids:
+            return [m for m in internal_sandbox.metric_groups[group_ids[item['id']]] if m in metrics]
+        return values.get(item['id'])
+
+    body = {
+        'output': output,
+        'outputs': [dict(zip(('id', 'property'), o.rsplit('.', 1))) for o in output.strip('.').split('...')],
+        'inputs': [{**item, 'value': value(item)} for item in spec['inputs']],
+        'state': [{**item, 'value': None} for item in spec['state']],
+        'changedPropIds': [],
+    }
+
+    def update_plot():
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"update_plot returned {response.status_code}")
+        return response
+
+    return [('internal_sandbox.update_plot', update_plot)]
+
+
+def run(datasets, repeat, include_dashboard=True):
+    """
+    Run every stage on every dataset.
+
+    Parameters:
+    datasets (list): (name, trc paths, sto paths) tuples.
+    repeat (int): Timed runs per stage.
+    include_dashboard (bool): Also time the Dash update_plot callback.
+
+    Returns:
+    list: One result dict per (stage, dataset).
+    """
+    from sto_processing import read_sto_header
+    from trc_reader import read_trc_header
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for name, trc_paths, sto_paths in datasets:
+            stages = []
+            if trc_paths:
+                headers = [read_trc_header(p)[0] for p in trc_paths]
+                frames = sum(int(h['NumFrames']) for h in headers)
+                markers = max(int(h['NumMarkers']) for h in headers)
+                stages += [(stage, func, frames, markers) for stage, func in trc_stages(trc_paths)]
+            if sto_paths:
+                frames = sum(int(read_sto_header(p)[0].get('nRows', 0)) for p in sto_paths)
+                stages += [(stage, func, frames, None) for stage, func in sto_stages(sto_paths)]
+                if include_dashboard:
+                    names = [os.path.basename(p) for p in sto_paths if os.path.dirname(p) == 'STOfiles']
+                    stages += [(stage, func, frames, None) for stage, func in
+                               dashboard_stages(names, {'knee_angle_r', 'hip_flexion_r'}, cache_dir)]
+            for stage, func, frames, markers in stages:
+                seconds, peak, _ = measure(func, repeat)
+                results.append(_result(stage, name, frames, markers, seconds, peak))
+                print(f"{name:>24} {stage:<36} {seconds * 1000:10.2f} ms {peak / 1e6:9.1f} MB "
+                      f"{results[-1]['frames_per_s']:12.0f} frames/s", file=sys.stderr)
+    return results
+
+
+def _result(stage, dataset, frames, markers, seconds, peak):
+    return {
+        'stage': stage,
+        'dataset': dataset,
+        'frames': frames,
+        'markers': markers,
+        'seconds': seconds,
+        'peak_bytes': peak,
+        'frames_per_s': frames / seconds if seconds > 0 else None,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Stages whose time grew by more than `threshold` (fraction) over the baseline.
+
+    Returns:
+    list: (stage, dataset, baseline seconds, seconds) of every regression.
+    """
+    previous = {(r['stage'], r['dataset']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        before = previous.get((r['stage'], r['dataset']))
+        if before and r['seconds'] > before * (1 + threshold):
+            regressions.append((r['stage'], r['dataset'], before, r['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark parsing, angle computation and dashboard callbacks.')
+    parser.add_argument('--out', default='bench_results.json', help='JSON file to write the results to')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (median is reported)')
+    parser.add_argument('--synthetic', nargs='*', default=['10000x85'],
+                        help='synthetic trials as FRAMESxMARKERS, e.g. 100000x500')
+    parser.add_argument('--no-bundled', action='store_true', help='skip the bundled TRCfiles/STOfiles')
+    parser.add_argument('--no-dashboard', action='store_true', help='skip the Dash update_plot stage')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown over the baseline (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = []
+        if not args.no_bundled:
+            datasets.append(('bundled', sorted(glob.glob('TRCfiles/*.trc')),
+                             sorted(glob.glob('STOfiles/*.sto'))))
+        for spec in args.synthetic:
+            n_frames, n_markers = (int(v) for v in spec.lower().split('x'))
+            path = write_synthetic_trc(os.path.join(tmp, f'synthetic_{spec}.trc'), n_frames, n_markers)
+            datasets.append((f'synthetic_{spec}', [path], []))
+        results = run(datasets, args.repeat, include_dashboard=not args.no_dashboard)
+
+    report = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for stage, dataset, before, after in regressions:
+            print(f"REGRESSION {stage} on {dataset}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions over {args.threshold:.0%} against {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# Derived channel names: '<column>_vel' (units/s) and '<column>_acc' (units/s^2),
+# e.g. knee_angle_r_vel in deg/s for an inDegrees=yes STO file
+SUFFIXES = ('_vel', '_acc')
+# Largest deviation of a sample interval from the median interval, as a
+# fraction of it, for which smoothing runs directly on the samples; less
+# regular trials are smoothed on a uniform grid (see time_derivatives)
+UNIFORM_TOLERANCE = 0.01
+
+
+def derivative_settings(path=None, **overrides):
+    """
+    Smoothing applied before differentiating: the marker filter settings of
+    the trial's movement (see marker_filtering.filter_settings), since
+    differentiation amplifies exactly the noise that filter removes.
+    """
+    from marker_filtering import filter_settings
+
+    return filter_settings(path, **overrides)
+
+
+def time_derivatives(time, values, smoothing=None):
+    """
+    Smoothed first and second time derivatives of every column at once.
+
+    Uses second-order central differences against the actual sample times
+    (np.gradient with a time coordinate), so non-uniform sampling is handled.
+    The low-pass filter assumes a fixed rate, so when the sample intervals
+    differ by more than UNIFORM_TOLERANCE the values are resampled onto a
+    uniform grid at the median interval, filtered and differentiated there,
+    and the derivatives interpolated back to the sample times.
+
+    Parameters:
+    time (ndarray): Strictly increasing sample times in seconds.
+    values (ndarray): Samples shaped (samples, channels).
+    smoothing (dict): marker_filtering settings applied to values first;
+        None differentiates the raw values.
+
+    Returns:
+    tuple: (velocity, acceleration), each shaped like values. Trials with
+    fewer than 3 samples give NaN.
+    """
+    from marker_filtering import filter_columns
+
+    time = np.asarray(time, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(time), -1)
+    if len(time) < 3:
+        nan = np.full(values.shape, np.nan)
+        return nan, nan.copy()
+    if smoothing is None:
+        velocity = np.gradient(values, time, axis=0, edge_order=2)
+        return velocity, np.gradient(velocity, time, axis=0, edge_order=2)
+    dt = np.diff(time)
+    step = np.median(dt)
+    if np.max(np.abs(dt - step)) <= UNIFORM_TOLERANCE * step:
+        values = filter_columns(values, 1.0 / step, smoothing)
+        velocity = np.gradient(values, time, axis=0, edge_order=2)
+        return velocity, np.gradient(velocity, time, axis=0, edge_order=2)
+    grid = time[0] + step * np.arange(max(int(round((time[-1] - time[0]) / step)) + 1, 3))
+    values = filter_columns(_interp_columns(grid, time, values), 1.0 / step, smoothing)
+    velocity = np.gradient(values, step, axis=0, edge_order=2)
+    acceleration = np.gradient(velocity, step, axis=0, edge_order=2)
+    return _interp_columns(time, grid, velocity), _interp_columns(time, grid, acceleration)
+
+
+def _interp_columns(x_new, x, values):
+    # Linear interpolation of all columns at once: the bracketing samples and
+    # weights are found once for x_new and applied to the whole block. Points
+    # outside x take the end values (like np.interp); a point whose bracketing
+    # interval touches a NaN sample is NaN
+    right = np.clip(np.searchsorted(x, x_new, side='right'), 1, len(x) - 1)
+    left = right - 1
+    weight = np.clip((x_new - x[left]) / (x[right] - x[left]), 0.0, 1.0)[:, None]
+    return values[left] + weight * (values[right] - values[left])
+
+
+def derivative_frame(df, columns=None, smoothing=None, time_column='time'):
+    """
+    Velocity and acceleration channels of a trial table.
+
+    Parameters:
+    df (DataFrame): STO frame or angle table with a time column.
+    columns (list of str): Columns to differentiate. Defaults to all others.
+    smoothing (dict): See time_derivatives.
+    time_column: Label of the time column.
+
+    Returns:
+    DataFrame: The time column, then '<column>_vel' and '<column>_acc' for
+    every column.
+    """
+    if columns is None:
+        columns = [c for c in df.columns if c != time_column]
+    velocity, acceleration = time_derivatives(df[time_column].to_numpy(), df[list(columns)].to_numpy(dtype=np.float64),
+                                              smoothing)
+    return _frame(df[time_column].to_numpy(), columns, velocity, acceleration)
+
+
+def _frame(time, columns, velocity, acceleration):
+    names = [f'{c}{SUFFIXES[0]}' for c in columns] + [f'{c}{SUFFIXES[1]}' for c in columns]
+    table = pd.DataFrame(np.hstack([velocity, acceleration]), columns=names)
+    table.insert(0, 'time', time)
+    return table
+
+
+def load_derivatives(path, smoothing=None):
+    """
+    Derivative channels of every coordinate of an STO file, computed once and
+    stored in the trial cache next to the parsed trial (recomputed when the
+    file or the smoothing settings change).
+
+    Parameters:
+    path (str): STO file.
+    smoothing (dict): Defaults to derivative_settings(path).
+
+    Returns:
+    DataFrame: 'time' plus '<coordinate>_vel' / '<coordinate>_acc' columns.
+    """
+    from trial_cache import load_derived, load_sto
+
+    smoothing = smoothing or derivative_settings(path)
+    df, _ = load_sto(path)
+    columns = [c for c in df.columns if c != 'time']
+
+    def compute():
+        velocity, acceleration = time_derivatives(df['time'].to_numpy(), df[columns].to_numpy(), smoothing)
+        return {'velocity': velocity, 'acceleration': acceleration}
+
+    arrays = load_derived(path, 'derivatives', {**smoothing, 'uniform_tolerance': UNIFORM_TOLERANCE}, compute)
+    return _frame(df['time'].to_numpy(), columns, arrays['velocity'], arrays['acceleration'])
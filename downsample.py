@@ -0,0 +1,90 @@
+import numpy as np
+
+# Roughly the plot width in pixels; traces are reduced to about this many
+# min/max pairs, which is as much detail as the screen can show
+SCREEN_POINTS = 1200
+
+
+def minmax_indices(y, bucket):
+    """
+    Indices of the minimum and maximum sample in every bucket of `bucket`
+    consecutive samples, in increasing order. Keeps every peak and valley of
+    the curve at 2 points per bucket.
+
+    Parameters:
+    y (ndarray): Samples.
+    bucket (int): Samples per bucket.
+
+    Returns:
+    ndarray: Sorted sample indices.
+    """
+    n = len(y)
+    if bucket <= 1 or n <= 2:
+        return np.arange(n)
+    n_full = n // bucket * bucket
+    blocks = np.asarray(y[:n_full]).reshape(-1, bucket)
+    offsets = np.arange(0, n_full, bucket)
+    picks = [np.sort(np.stack([blocks.argmin(axis=1) + offsets, blocks.argmax(axis=1) + offsets], axis=1), axis=1).ravel()]
+    if n_full < n:
+        tail = np.asarray(y[n_full:])
+        picks.append(np.unique([n_full + tail.argmin(), n_full + tail.argmax()]))
+    # Always keep the end points so the curve spans the full time range
+    return np.unique(np.concatenate([[0], *picks, [n - 1]]))
+
+
+def minmax_downsample(x, y, max_points=SCREEN_POINTS * 2):
+    """
+    Reduce a curve to at most about max_points samples with min/max bucketing.
+
+    Returns:
+    tuple: (x, y) of the kept samples.
+    """
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    idx = minmax_indices(y, int(np.ceil(2 * n / max_points)))
+    return np.asarray(x)[idx], np.asarray(y)[idx]
+
+
+class LODPyramid:
+    """
+    Precomputed min/max levels of detail for one curve.
+
+    Level 0 is the raw curve; each further level halves the number of points,
+    down to about `base_points`. A zoom is then answered by slicing the finest
+    level that fits the requested window into max_points, instead of
+    recomputing the downsampling.
+
+    Parameters:
+    x (ndarray): Monotonic sample positions (e.g. time).
+    y (ndarray): Samples.
+    base_points (int): Point count of the coarsest level.
+    """
+
+    def __init__(self, x, y, base_points=SCREEN_POINTS * 2):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        n = len(self.y)
+        self.levels = [(1, np.arange(n))]
+        bucket = 2
+        while len(self.levels[-1][1]) > base_points:
+            bucket *= 2
+            self.levels.append((bucket, minmax_indices(self.y, bucket)))
+
+    def window(self, x0=None, x1=None, max_points=SCREEN_POINTS * 2):
+        """
+        Samples between x0 and x1 at the finest level with at most max_points
+        points in that window. None means the start/end of the curve.
+
+        Returns:
+        tuple: (x, y) of the kept samples.
+        """
+        lo = 0 if x0 is None else np.searchsorted(self.x, x0, side='left')
+        hi = len(self.x) if x1 is None else np.searchsorted(self.x, x1, side='right')
+        # Keep one sample past each edge so the line runs to the plot border
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(self.x))
+        for bucket, idx in self.levels:
+            start, stop = np.searchsorted(idx, [lo, hi])
+            if stop - start <= max_points or bucket == self.levels[-1][0]:
+                picked = idx[start:stop]
+                return self.x[picked], self.y[picked]
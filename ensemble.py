@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from time_normalization import CYCLE_POINTS, cycle_grids, resample, time_grids
+
+# Percentiles computed for every ensemble; 25/50/75 drive the median + IQR band
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def ensemble_stats(values, percentiles=PERCENTILES):
+    """
+    Per-sample statistics across trials, reduced over the trial axis in one
+    pass: a single sort along axis 0 gives min, max and every percentile, and
+    NaN (a trial without that sample or metric) is skipped throughout.
+
+    Parameters:
+    values (ndarray): Stacked trials shaped (trials, samples, metrics).
+    percentiles (tuple): Percentiles in [0, 100], linearly interpolated.
+
+    Returns:
+    dict: 'n' (trials present), 'mean', 'sd' (sample SD, 0 for one trial), 'min', 'max' and
+    'p<q>' per percentile, each shaped (samples, metrics). Samples with no
+    trials are NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    n = present.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = np.where(present, values, 0.0).sum(axis=0)
+        mean = total / n
+        squares = np.where(present, (values - mean) ** 2, 0.0).sum(axis=0)
+        sd = np.sqrt(squares / (n - 1))
+    # A single trial has a zero-width band; no trials has none
+    sd = np.where(n > 1, sd, np.where(n == 1, 0.0, np.nan))
+
+    # NaN sorts last, so the valid samples of each column are ordered[:n]
+    ordered = np.sort(values, axis=0)
+    last = np.maximum(n - 1, 0)
+    stats = {
+        'n': n,
+        'mean': mean,
+        'sd': sd,
+        'min': ordered[0],
+        'max': np.take_along_axis(ordered, last[None], axis=0)[0],
+    }
+    for q in percentiles:
+        position = last * (q / 100.0)
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, last)
+        low = np.take_along_axis(ordered, below[None], axis=0)[0]
+        high = np.take_along_axis(ordered, above[None], axis=0)[0]
+        stats[f'p{q:g}'] = low + (position - below) * (high - low)
+    return stats
+
+
+def ensemble(trials, columns, base='cycle', n_points=CYCLE_POINTS, dt=None, bounds=None,
+             percentiles=PERCENTILES):
+    """
+    Align trials onto a common base and reduce them to per-sample statistics.
+
+    Trials are resampled onto the base, stacked into one (trials, samples,
+    metrics) array and reduced by ensemble_stats. A trial without one of the
+    columns counts as missing for that metric only.
+
+    Parameters:
+    trials (list of DataFrame): Trials with a 'time' column.
+    columns (list of str): Metrics to aggregate.
+    base (str): 'cycle' (0-100% of each trial, or of `bounds`) or 'time'
+        (seconds from each trial's start).
+    n_points (int): Cycle grid points.
+    dt (float): Time grid step. Defaults to the finest median step.
+    bounds (list of tuple): (start, end) of the cycle in each trial.
+    percentiles (tuple): See ensemble_stats.
+
+    Returns:
+    tuple: (grid, stats dict with arrays shaped (samples, len(columns)))
+    """
+    if base == 'cycle':
+        grid, grids = cycle_grids(trials, n_points, bounds)
+    elif base == 'time':
+        grid, grids = time_grids(trials, dt)
+    else:
+        raise ValueError(f"Invalid base: {base}")
+    columns = list(columns)
+    values = np.full((len(trials), len(grid), len(columns)), np.nan)
+    # Trials sharing the same subset of the columns are resampled together
+    groups = {}
+    for i, df in enumerate(trials):
+        groups.setdefault(tuple(j for j, c in enumerate(columns) if c in df.columns), []).append(i)
+    for positions, members in groups.items():
+        if positions:
+            block = resample([trials[i] for i in members], [columns[j] for j in positions], grids[members])
+            values[np.ix_(members, np.arange(len(grid)), positions)] = block
+    return grid, ensemble_stats(values, percentiles)
+
+
+class EnsembleCache:
+    """
+    Memoizes ensembles keyed on the trial set (order-insensitive, with each
+    trial's identity), the metrics and the alignment, so re-rendering a band
+    view or toggling back to it costs nothing.
+
+    Parameters:
+    loader (callable): name -> DataFrame with a 'time' column.
+    identity (callable): name -> hashable identity of the trial's contents.
+    maxsize (int): Number of ensembles kept.
+    """
+
+    def __init__(self, loader, identity, maxsize=64):
+        self.loader = loader
+        self.identity = identity
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, names, columns, base='cycle', n_points=CYCLE_POINTS):
+        """
+        Return (grid, stats) of ensemble() over the named trials.
+        """
+        names = sorted(set(names))
+        key = (tuple((name, self.identity(name)) for name in names), tuple(columns), base, n_points)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        result = ensemble([self.loader(name) for name in names], columns, base, n_points)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
@@ -0,0 +1,214 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# --- CONFIGURATION ---
+# PIPELINE_INSTRUMENT=1 records wall time and rows per stage;
+# PIPELINE_INSTRUMENT=memory also records the allocation high-water mark of
+# each stage with tracemalloc (slower). Unset or 0 disables it: stage() then
+# returns a shared no-op context and instrumented functions are called directly.
+INSTRUMENT = os.environ.get("PIPELINE_INSTRUMENT", "").strip().lower()
+ENABLED = INSTRUMENT not in ("", "0", "false", "off")
+TRACE_MEMORY = INSTRUMENT == "memory"
+# One JSON record per stage is appended here ('-' for stderr)
+INSTRUMENT_LOG = os.environ.get("PIPELINE_INSTRUMENT_LOG", "-")
+
+
+class _NullStage:
+    """
+    Context returned by stage() when instrumentation is off.
+    """
+    __slots__ = ()
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageMetrics:
+    """
+    Running totals per stage, rendered as Prometheus text by prometheus_text().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def add(self, record):
+        with self._lock:
+            totals = self._stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'rows': 0,
+                                                               'errors': 0, 'peak_bytes': 0})
+            totals['calls'] += 1
+            totals['seconds'] += record['seconds']
+            totals['rows'] += record['rows'] or 0
+            totals['errors'] += record['error'] is not None
+            totals['peak_bytes'] = max(totals['peak_bytes'], record.get('peak_bytes') or 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(totals) for name, totals in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+metrics = StageMetrics()
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def _emit(record):
+    line = json.dumps(record)
+    with _log_lock:
+        if INSTRUMENT_LOG == "-":
+            print(line, file=sys.stderr)
+        else:
+            with open(INSTRUMENT_LOG, 'a') as f:
+                f.write(line + '\n')
+
+
+class _Stage:
+    """
+    Timing context of one stage. Set `rows` inside the block to record how
+    many rows/frames the stage processed.
+    """
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self._child_peak = 0
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Keep the enclosing stage's peak before resetting it for this one
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+            self._start_bytes = current
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        stack = _local.stack
+        stack.pop()
+        record = {
+            'stage': self.name,
+            'seconds': seconds,
+            'rows': self.rows,
+            'rows_per_s': self.rows / seconds if self.rows and seconds > 0 else None,
+            'error': None if exc_type is None else exc_type.__name__,
+            'ts': time.time(),
+        }
+        if TRACE_MEMORY:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._child_peak)
+            record['peak_bytes'] = peak - self._start_bytes
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+        metrics.add(record)
+        _emit(record)
+        return False
+
+
+def stage(name, rows=None):
+    """
+    Context manager timing one pipeline stage.
+
+    Parameters:
+    name (str): Stage name, e.g. 'full_pipeline.read_in_files'.
+    rows (int): Rows processed, if known up front; can also be set on the
+        returned object inside the block.
+
+    Returns:
+    The stage context, or a shared no-op context when instrumentation is off.
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+
+def instrumented(name=None):
+    """
+    Decorator recording every call of a function as one stage.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Stage(stage_name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def prometheus_text(snapshot=None):
+    """
+    Stage totals in the Prometheus text exposition format.
+    """
+    snapshot = metrics.snapshot() if snapshot is None else snapshot
+    series = [
+        ('pipeline_stage_calls_total', 'counter', 'Calls of each pipeline stage.', 'calls'),
+        ('pipeline_stage_seconds_total', 'counter', 'Wall time spent in each pipeline stage.', 'seconds'),
+        ('pipeline_stage_rows_total', 'counter', 'Rows processed by each pipeline stage.', 'rows'),
+        ('pipeline_stage_errors_total', 'counter', 'Calls of each pipeline stage that raised.', 'errors'),
+    ]
+    if TRACE_MEMORY:
+        series.append(('pipeline_stage_peak_bytes', 'gauge',
+                       'Largest allocation high-water mark of each pipeline stage.', 'peak_bytes'))
+    lines = []
+    for metric, kind, help_text, key in series:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, totals in sorted(snapshot.items()):
+            lines.append(f'{metric}{{stage="{_label(name)}"}} {totals[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def gauge_text(metric, help_text, label, values):
+    """
+    One Prometheus gauge with a sample per {label: value} entry.
+    """
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+    lines += [f'{metric}{{{label}="{_label(key)}"}} {value}' for key, value in sorted(values.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics_route(server, path='/metrics', extra=None):
+    """
+    Serve prometheus_text() from a Flask server (e.g. a Dash app's app.server),
+    followed by the text of extra() when given.
+    """
+    def metrics_view():
+        text = prometheus_text() + (extra() if extra is not None else '')
+        return text, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    server.add_url_rule(path, 'pipeline_metrics', metrics_view)
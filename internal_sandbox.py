@@ -1,25 +1,142 @@
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, Patch, ClientsideFunction, ctx, no_update
 import plotly.graph_objs as go
+from plotly.colors import qualitative
 import pandas as pd
 import os
+import threading
+import time
+from trial_cache import load_sto
+from sto_processing import STOTrial
+from trial_store import TrialStore, open_library
+from plot_traces import (GL_POINT_THRESHOLD, TraceCache, build_band_traces, build_trace, file_identity, pack_columns,
+                         trace_name)
+from time_normalization import CycleCache
+from ensemble import EnsembleCache
+from derivatives import SUFFIXES, load_derivatives
+from trc_stream import LiveAngles, SocketFrameSource, TRCTail
+from osim_reader import DEFAULT_MODEL, read_osim
+from trial_catalog import STATS, TRC_ANGLES, parse_trial_name, query_trials, update_catalog
+import instrumentation
+from instrumentation import instrumented, stage
 
 # --- CONFIGURATION ---
 STO_FOLDER = "STOfiles"
+# SQLite trial catalog behind the file filters; prebuild it with
+# `python trial_catalog.py STOfiles --db <path>` to skip the first-use build
+CATALOG_PATH = os.environ.get("TRIAL_CATALOG", "trial_catalog.sqlite")
+# Memory budget for parsed trials held by the app (bytes)
+TRIAL_MEMORY_BUDGET = int(os.environ.get("TRIAL_MEMORY_BUDGET", 256 * 1024 * 1024))
+# Serving mode: TRIAL_LIBRARY=dir parses every trial once into a read-only
+# memory-mapped library that all worker processes attach to (see wsgi.py)
+TRIAL_LIBRARY = os.environ.get("TRIAL_LIBRARY")
+# COMPACT_TRIALS=1 holds loaded trials as float32 (half the memory of float64);
+# the trial library is one shared float64 copy, so it applies there only to
+# trials served outside the library
+COMPACT_TRIALS = os.environ.get("COMPACT_TRIALS", "0") == "1"
+# Number of trials to load in the background after startup (0 disables)
+PREFETCH_TRIALS = int(os.environ.get("PREFETCH_TRIALS", 0))
+# Live mode: follow a TRC file being written (LIVE_TRC=path) or accept TRC
+# lines on a local socket (LIVE_TRC_PORT=port) and plot angles as they arrive
+LIVE_TRC = os.environ.get("LIVE_TRC")
+LIVE_TRC_PORT = os.environ.get("LIVE_TRC_PORT")
+LIVE_ANGLES = os.environ.get("LIVE_ANGLES", "knee_r,knee_l").split(",")
+# Frames kept server-side and points kept in the live plot
+LIVE_BUFFER_FRAMES = int(os.environ.get("LIVE_BUFFER_FRAMES", 10000))
+LIVE_PLOT_POINTS = int(os.environ.get("LIVE_PLOT_POINTS", 3000))
+# Model whose coordinates the metric groups and .sto columns are checked
+# against; METRIC_GROUPS=model builds the groups from its joints instead of metrics.csv
+OSIM_MODEL = os.environ.get("OSIM_MODEL", DEFAULT_MODEL)
+METRIC_GROUPS = os.environ.get("METRIC_GROUPS", "csv")
+# Playback cursor step (ms of wall time per frame advance in the browser)
+PLAYBACK_INTERVAL_MS = int(os.environ.get("PLAYBACK_INTERVAL_MS", 40))
+# CLIENT_TRACES=1 sends each selected trial's columns to the browser once and
+# shows/hides metrics there (assets/client_traces.js) instead of in update_plot
+CLIENT_TRACES = os.environ.get("CLIENT_TRACES", "0") == "1"
+# DASH_DEBUG=1 enables the reloader and in-browser tracebacks for local runs;
+# keep it off on anything reachable from other machines
+DEBUG = os.environ.get("DASH_DEBUG", "0") == "1"
+# DERIVED_CHANNELS=0 drops the Velocity/Acceleration metric groups
+DERIVED_CHANNELS = os.environ.get("DERIVED_CHANNELS", "1") == "1"
+# Seconds between rescans of STO_FOLDER for new files (e.g. angle .sto files
+# written by batch_pipeline.py --watch); 0 disables
+FILE_REFRESH_SECONDS = float(os.environ.get("FILE_REFRESH_SECONDS", 30))
+
+def scan_sto_files():
+    # Directory metadata only; trial data is loaded on first selection
+    return sorted(e.name for e in os.scandir(STO_FOLDER) if e.is_file() and e.name.endswith('.sto'))
+
 # Gather all .sto files in the folder
-sto_files = [f for f in os.listdir(STO_FOLDER) if f.endswith('.sto')]
+sto_files = scan_sto_files()
+
+model = read_osim(OSIM_MODEL) if os.path.exists(OSIM_MODEL) else None
+
+# File identity each loaded trial was read at (see load_trial)
+trial_identities = {}
 
-# Read all files and store DataFrames in a dict
 def read_sto_file(path):
-    with open(path) as f:
-        for i, line in enumerate(f):
-            if 'endheader' in line:
-                header_line = i
-                break
-    df = pd.read_csv(path, sep='\t', header=header_line-1)
+    trial_identities[os.path.basename(path)] = file_identity(path)
+    # Parsed files are served from the binary trial cache when up to date
+    df, header = load_sto(path)
+    # Only coordinate files are expected to match the model (not e.g. TRC angle files)
+    if model is not None and header.get('name') == 'Coordinates':
+        columns = model.check_columns(df.columns)
+        if columns['missing'] or columns['unknown']:
+            print(f"Warning: {path} does not match {OSIM_MODEL}: "
+                  f"missing {columns['missing']}, unknown {columns['unknown']}")
+    if DERIVED_CHANNELS:
+        # Derivatives are cached in the trial cache next to the parsed file
+        derived = load_derivatives(path)
+        df = pd.concat([df, derived[[m for m in all_metrics if m in derived.columns]]], axis=1)
+    if COMPACT_TRIALS:
+        df = STOTrial.from_frame(df, header, path).to_dataframe()
     return df
 
-dfs = {fname: read_sto_file(os.path.join(STO_FOLDER, fname)) for fname in sto_files}
+# Per-trial metadata and metric summaries used by the file filters, kept up
+# to date by a background thread in each serving process: started by the
+# first filter callback (not at import, so startup does not parse every
+# trial, and never inside a callback), then rescanning every
+# FILE_REFRESH_SECONDS. Only new or changed files are summarized
+catalog_lock = threading.Lock()
+catalog_thread = None
+catalog_ready = threading.Event()
+
+def refresh_catalog():
+    global sto_files
+    files = scan_sto_files()
+    updated, _ = update_catalog([STO_FOLDER], db_path=CATALOG_PATH)
+    if catalog_ready.is_set():
+        # Trials loaded before this pass may be stale; the first pass only
+        # summarizes files the app has not loaded yet
+        for path in updated:
+            trials.evict(os.path.basename(path))
+    sto_files = files
+
+def run_catalog():
+    while True:
+        try:
+            refresh_catalog()
+        except Exception as exc:  # e.g. another worker holds the write lock; retried next pass
+            print(f"Warning: trial catalog refresh failed: {type(exc).__name__}: {exc}")
+        catalog_ready.set()
+        if FILE_REFRESH_SECONDS <= 0:
+            return
+        time.sleep(FILE_REFRESH_SECONDS)
+
+def start_catalog():
+    global catalog_thread
+    with catalog_lock:
+        if catalog_thread is None:
+            catalog_thread = threading.Thread(target=run_catalog, name='trial-catalog', daemon=True)
+            catalog_thread.start()
+
+def name_matches(fname, movements, subjects):
+    fields = parse_trial_name(fname)
+    return (not movements or fields['movement'] in movements) and (not subjects or fields['subject'] in subjects)
+
+def name_values(field):
+    # Filter options from the file names alone, so the layout needs no catalog
+    return sorted({value for f in sto_files if (value := parse_trial_name(f)[field]) is not None})
 
 # Define the mapping for file names to more readable names
 mapping = {
@@ -33,31 +150,118 @@ mapping = {
 
 # --- METRICS CONFIGURATION ---
 
-# Read the metrics.csv file
-metrics_df = pd.read_csv("metrics.csv")
+if METRIC_GROUPS == "model" and model is not None:
+    # Generate the groups from the model's joint tree
+    metric_groups = model.metric_groups()
+else:
+    # Read the metrics.csv file
+    metrics_df = pd.read_csv("metrics.csv")
+
+    # Build the metric_groups dictionary from the CSV
+    metric_groups = {}
+    for col in metrics_df.columns:
+        # Drop NaN and empty strings, keep only valid metric names
+        metrics = [m for m in metrics_df[col].dropna() if str(m).strip() != ""]
+        metric_groups[col] = metrics
 
-# Build the metric_groups dictionary from the CSV
-metric_groups = {}
-for col in metrics_df.columns:
-    # Drop NaN and empty strings, keep only valid metric names
-    metrics = [m for m in metrics_df[col].dropna() if str(m).strip() != ""]
-    metric_groups[col] = metrics
+    if model is not None:
+        unknown = [m for metrics in metric_groups.values() for m in metrics if m not in model.coordinates]
+        if unknown:
+            print(f"Warning: metrics.csv lists metrics that are not coordinates of {OSIM_MODEL}: {unknown}")
 
+# Angles written from TRC trials by batch_pipeline.py --sto-out
+metric_groups['TRC'] = [f"{angle_type}_angle" for angle_type in TRC_ANGLES]
+
+# Coordinates the catalog filters can use
+coordinate_metrics = [metric for metrics in metric_groups.values() for metric in metrics]
+if DERIVED_CHANNELS:
+    # Smoothed angular velocity/acceleration of every grouped coordinate
+    metric_groups['Velocity'] = [f"{m}{SUFFIXES[0]}" for m in coordinate_metrics]
+    metric_groups['Acceleration'] = [f"{m}{SUFFIXES[1]}" for m in coordinate_metrics]
 all_metrics = [metric for metrics in metric_groups.values() for metric in metrics]
 
+def read_trial(fname):
+    return read_sto_file(os.path.join(STO_FOLDER, fname))
+
+# Loaded trials, kept in an LRU cache within TRIAL_MEMORY_BUDGET, or shared
+# between processes through the trial library. The library is built with the
+# plain loader so the parsed trials are not also held by the fallback store
+# (and inherited by every worker forked from a --preload master); the store
+# only serves files missing from the library or changed since it was built
+trials = TrialStore(read_trial, TRIAL_MEMORY_BUDGET)
+if TRIAL_LIBRARY:
+    trials = open_library(TRIAL_LIBRARY, {f: os.path.join(STO_FOLDER, f) for f in sto_files}, read_trial,
+                          fallback=trials, params={'derived': DERIVED_CHANNELS, 'compact': COMPACT_TRIALS})
+if PREFETCH_TRIALS:
+    trials.prefetch(sto_files[:PREFETCH_TRIALS])
+
+def load_trial(fname):
+    # Reload a trial whose file changed since it was loaded, so the plot
+    # caches keyed on the new identity are not rebuilt from stale data
+    identity = file_identity(os.path.join(STO_FOLDER, fname))
+    if trial_identities.setdefault(fname, identity) != identity:
+        trials.evict(fname)
+    return trials.get(fname)
+
+# --- LIVE MODE ---
+
+live = None
+live_section = []
+if LIVE_TRC or LIVE_TRC_PORT:
+    source = TRCTail(LIVE_TRC) if LIVE_TRC else SocketFrameSource(port=int(LIVE_TRC_PORT))
+    # Polling starts with the first live callback, in the process serving it
+    live = LiveAngles(source, LIVE_ANGLES, capacity=LIVE_BUFFER_FRAMES)
+    live_section = [
+        html.H3("Live Angles"),
+        dcc.Graph(id='live-plot', figure=go.Figure(
+            [go.Scatter(x=[], y=[], mode='lines', name=f"{angle_type} angle") for angle_type in LIVE_ANGLES],
+            layout=dict(xaxis_title="Time (s)", yaxis_title="Angle (degrees)")
+        )),
+        dcc.Interval(id='live-interval', interval=200),
+        # Last live frame and recording this browser has received
+        dcc.Store(id='live-position', data={'position': 0, 'session': 0}),
+    ]
+
 
 # --- DASH APP ---
 
+FIGURE_LAYOUT = dict(
+    xaxis_title="Time (s)",
+    yaxis_title="Value",
+    title="Kinematic Curves",
+    legend_title="Metric - File",
+    # Keep the user's zoom when traces are patched in or out
+    uirevision="kinematic-plot"
+)
+
 app = dash.Dash(__name__)
+if instrumentation.ENABLED:
+    # Prometheus text endpoint with the per-stage totals and the bytes held
+    # by each loaded trial
+    instrumentation.register_metrics_route(app.server, extra=lambda: instrumentation.gauge_text(
+        'trial_bytes', 'Bytes held by each loaded trial.', 'trial', trials.stats()['per_trial']))
 
 app.layout = html.Div([
     html.H2("Dynamic Kinematic Plotter"),
     # Box around file selection
     html.Div([
+        # Filters answered from the trial catalog, without loading trials
+        html.Div([
+            dcc.Dropdown(id='filter-movement', options=name_values('movement'), multi=True,
+                         placeholder="Movement", style={'minWidth': '160px'}),
+            dcc.Dropdown(id='filter-subject', options=name_values('subject'), multi=True,
+                         placeholder="Subject", style={'minWidth': '140px'}),
+            dcc.Dropdown(id='filter-metric', options=coordinate_metrics, placeholder="Metric",
+                         style={'minWidth': '200px'}),
+            dcc.Dropdown(id='filter-stat', options=list(STATS), value='rom', clearable=False,
+                         style={'minWidth': '120px'}),
+            dcc.Input(id='filter-min', type='number', placeholder="min", debounce=True),
+            dcc.Input(id='filter-max', type='number', placeholder="max", debounce=True),
+        ], style={'display': 'flex', 'gap': '8px', 'margin-bottom': '12px'}),
         html.Label("Select Files:"),
         dcc.Checklist(
             id='file-checklist',
-            options=[{'label': mapping[f], 'value': f} for f in sto_files],
+            options=[{'label': mapping.get(f, f), 'value': f} for f in sto_files],
             value=[],
             inline=True
         ),
@@ -88,7 +292,7 @@ app.layout = html.Div([
                 for group in list(metric_groups.keys())[:5]
             ]
         ], style={'display': 'flex', 'flex-direction': 'row', 'align-items': 'flex-start', 'margin-bottom': '20px'}),
-        # Second row: next 6 metric groups
+        # Second row: the remaining metric groups
         html.Div([
             *[
                 html.Div([
@@ -100,7 +304,7 @@ app.layout = html.Div([
                         inline=True
                     ),
                 ], style={'margin-right': '40px', 'minWidth': '200px'})
-                for group in list(metric_groups.keys())[5:11]
+                for group in list(metric_groups.keys())[5:]
             ]
         ], style={'display': 'flex', 'flex-direction': 'row', 'align-items': 'flex-start'}),
     ], style={
@@ -110,43 +314,327 @@ app.layout = html.Div([
         'background': '#f5f7fa',
         'margin-bottom': '20px'
     }),
-    dcc.Graph(id='kinematic-plot')
+    dcc.RadioItems(
+        id='time-mode',
+        options=[{'label': 'Raw time', 'value': 'raw'}, {'label': 'Normalized cycle (0-100%)', 'value': 'cycle'}],
+        value='raw',
+        inline=True
+    ),
+    # Band views draw a few aggregate traces per metric instead of one per trial
+    # (server-rendered view only)
+    dcc.RadioItems(
+        id='plot-view',
+        options=[{'label': 'Individual traces', 'value': 'traces'},
+                 {'label': 'Band: mean ± SD, min/max', 'value': 'sd'},
+                 {'label': 'Band: median, IQR, 5-95%', 'value': 'iqr'}],
+        value='traces',
+        inline=True,
+        style={'display': 'none'} if CLIENT_TRACES else {}
+    ),
+    dcc.Graph(id='kinematic-plot', className='playback-synced'),
+    # Playback: the cursor is moved in the browser (assets/playback.js) over
+    # every graph with the 'playback-synced' class
+    html.Div([
+        html.Label("Playback:"),
+        dcc.Dropdown(id='playback-file', options=[], placeholder="Select a file", clearable=False,
+                     style={'width': '280px'}),
+        html.Button("Play", id='playback-play', n_clicks=0),
+        html.Div(dcc.Slider(id='playback-slider', min=0, max=0, step=1, value=0, marks=None,
+                            updatemode='drag'), style={'flex': '1'}),
+        html.Span(id='playback-readout', style={'minWidth': '200px'}),
+    ], style={'display': 'flex', 'alignItems': 'center', 'gap': '12px'}),
+    html.Details([
+        html.Summary("Pose at cursor"),
+        html.Pre(id='playback-pose', style={'maxHeight': '240px', 'overflow': 'auto'}),
+    ]),
+    dcc.Interval(id='playback-interval', interval=PLAYBACK_INTERVAL_MS, disabled=True),
+    # Time column and every coordinate (the model pose) of the playback trial
+    # as packed float32, sent once per trial
+    dcc.Store(id='playback-data', data=None),
+    # [file, metric] of the traces currently in the figure, in order
+    dcc.Store(id='plotted-traces', data=None),
+    # Zoomed time window [x0, x1], or None for the full trials
+    dcc.Store(id='plot-window', data=None),
+    dcc.Interval(id='file-refresh', interval=max(FILE_REFRESH_SECONDS, 1) * 1000,
+                 disabled=not FILE_REFRESH_SECONDS),
+    # CLIENT_TRACES mode: packed columns of every trial loaded into the
+    # browser, the trials it still needs, and the figure settings
+    dcc.Store(id='trial-columns', data={}),
+    dcc.Store(id='trial-request', data=None),
+    dcc.Store(id='client-trace-config', data=dict(
+        layout=go.Layout(**FIGURE_LAYOUT).to_plotly_json(), gl_threshold=GL_POINT_THRESHOLD
+    ) if CLIENT_TRACES else None),
+    *live_section
 ])
 from dash.dependencies import ALL
 
+# Memoized per-(file, metric) trace payloads
+traces = TraceCache(load_trial, lambda fname: os.path.join(STO_FOLDER, fname))
+# Memoized cycle-normalized trials for the "normalized cycle" view
+cycles = CycleCache(load_trial, lambda fname: file_identity(os.path.join(STO_FOLDER, fname)))
+# Mean/SD/percentile bands, memoized per (trial set, metrics, time mode)
+ensembles = EnsembleCache(load_trial, lambda fname: file_identity(os.path.join(STO_FOLDER, fname)))
+
+def get_trace(fname, metric, time_mode, window=None):
+    """
+    Trace for a metric of a file in raw time (optionally zoomed to window)
+    or on the 0-100% cycle grid. None if the file has no such metric.
+    """
+    if time_mode != 'cycle':
+        return traces.get(fname, metric, x_range=window)
+    table = cycles.get(fname)
+    if metric not in table.columns:
+        return None
+    return build_trace(table['cycle'].to_numpy(), table[metric].to_numpy(), trace_name(fname, metric))
+
+def relayout_window(relayout):
+    """
+    Time window (x0, x1) selected by a zoom/pan relayout event, None when the
+    x axis was reset, or False when the event did not touch the x axis.
+    """
+    if not relayout:
+        return False
+    if relayout.get('xaxis.autorange') or relayout.get('autosize'):
+        return None
+    if 'xaxis.range[0]' in relayout:
+        return [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']]
+    if 'xaxis.range' in relayout:
+        return list(relayout['xaxis.range'])
+    return False
+
 @app.callback(
-    Output('kinematic-plot', 'figure'),
-    [Input('file-checklist', 'value')] +
-    [Input(f"{group.lower()}-metrics", 'value') for group in metric_groups.keys()]
+    Output('file-checklist', 'options'),
+    Input('filter-movement', 'value'),
+    Input('filter-subject', 'value'),
+    Input('filter-metric', 'value'),
+    Input('filter-stat', 'value'),
+    Input('filter-min', 'value'),
+    Input('filter-max', 'value'),
+    Input('file-refresh', 'n_intervals'),
+    State('file-checklist', 'options')
 )
+def filter_files(movements, subjects, metric, stat, low, high, _, current):
+    # Only queries the catalog; files added or changed since the last scan
+    # appear on the next refresh tick after the background pass picked them up
+    start_catalog()
+    files = sto_files
+    if catalog_ready.is_set():
+        matches = set(query_trials(CATALOG_PATH, kind='sto', movement=movements, subject=subjects, metric=metric,
+                                   stat=stat, minimum=low, maximum=high))
+        files = [f for f in files if os.path.abspath(os.path.join(STO_FOLDER, f)) in matches]
+    else:
+        # First catalog pass still running: filter on the file names alone
+        files = [f for f in files if name_matches(f, movements, subjects)]
+    options = [{'label': mapping.get(f, f), 'value': f} for f in files]
+    return no_update if options == current else options
+
+@instrumented('update_plot')
 def update_plot(selected_files, *selected_metrics_groups):
+    *selected_metrics_groups, time_mode, view, relayout, plotted, window = selected_metrics_groups
+
+    if ctx.triggered_id == 'kinematic-plot':
+        # Zoom or pan: re-fetch the visible window of every trace at the
+        # finest level of detail that fits the screen (raw time only; the
+        # cycle view is already at its final resolution)
+        new_window = relayout_window(relayout)
+        if time_mode == 'cycle' or new_window is False or new_window == window or not plotted:
+            return no_update, no_update, no_update
+        patch = Patch()
+        for i, key in enumerate(plotted):
+            trace = traces.get(*key, x_range=new_window)
+            patch['data'][i]['x'] = trace['x']
+            patch['data'][i]['y'] = trace['y']
+        return patch, no_update, new_window
+
     # Flatten all selected metrics into a single list
     selected_metrics = []
     for group_metrics in selected_metrics_groups:
         if group_metrics:
             selected_metrics.extend(group_metrics)
-    fig = go.Figure()
+
+    if view in ('sd', 'iqr'):
+        # Band view: always a whole figure; plotted=None makes the next
+        # individual-traces render start from scratch too
+        return build_band_figure(selected_files, selected_metrics, time_mode, view), None, None
+
+    if time_mode == 'cycle' and selected_files:
+        # Normalize every selected trial that is not cached yet in one batch
+        cycles.get_many(selected_files)
+
+    wanted = []
     for fname in selected_files:
-        df = dfs[fname]
         for metric in selected_metrics:
-            if metric in df.columns:
-                fig.add_trace(go.Scatter(
-                    x=df['time'],
-                    y=df[metric],
-                    mode='lines',
-                    name=f"{metric} - {fname}"
-                ))
-    fig.update_layout(
-        xaxis_title="Time (s)",
-        yaxis_title="Value",
-        title="Kinematic Curves",
-        legend_title="Metric - File"
-    )
+            if metric in load_trial(fname).columns:
+                wanted.append([fname, metric])
+
+    if ctx.triggered_id in (None, 'time-mode', 'plot-view') or plotted is None:
+        # Initial render or a change of time axis or view: send the whole figure
+        if ctx.triggered_id in ('time-mode', 'plot-view'):
+            window = None
+        layout = dict(FIGURE_LAYOUT)
+        if time_mode == 'cycle':
+            layout.update(xaxis_title="Cycle (%)", uirevision=f"kinematic-plot-{time_mode}")
+        with stage('update_plot.build_figure', len(wanted)):
+            fig = go.Figure(layout=layout)
+            fig.add_traces([get_trace(*key, time_mode, window) for key in wanted])
+        return fig, wanted, window
+
+    # Otherwise patch the figure in place: drop traces that were deselected and
+    # append the new ones, so toggling one metric sends one trace
+    patch = Patch()
+    kept = []
+    for i in reversed(range(len(plotted))):
+        if plotted[i] in wanted:
+            kept.append(plotted[i])
+        else:
+            del patch['data'][i]
+    kept.reverse()
+    for key in wanted:
+        if key not in kept:
+            patch['data'].append(get_trace(*key, time_mode, window))
+            kept.append(key)
+    return patch, kept, window
+
+def build_band_figure(selected_files, selected_metrics, time_mode, view):
+    """
+    Figure with one band per selected metric aggregated over the selected files.
+    """
+    layout = dict(FIGURE_LAYOUT)
+    layout.update(title=f"Ensemble of {len(selected_files)} trials",
+                  uirevision=f"kinematic-plot-band-{time_mode}")
+    if time_mode == 'cycle':
+        layout.update(xaxis_title="Cycle (%)")
+    fig = go.Figure(layout=layout)
+    if not selected_files or not selected_metrics:
+        return fig
+    metrics = list(dict.fromkeys(selected_metrics))
+    with stage('update_plot.ensemble', len(selected_files)):
+        grid, stats = ensembles.get(selected_files, metrics, 'cycle' if time_mode == 'cycle' else 'time')
+    if view == 'sd':
+        center, lower, upper = stats['mean'], stats['mean'] - stats['sd'], stats['mean'] + stats['sd']
+        low, high = stats['min'], stats['max']
+    else:
+        center, lower, upper, low, high = stats['p50'], stats['p25'], stats['p75'], stats['p5'], stats['p95']
+    palette = qualitative.Plotly
+    for j, metric in enumerate(metrics):
+        if not stats['n'][:, j].any():
+            continue
+        fig.add_traces(build_band_traces(grid, center[:, j], lower[:, j], upper[:, j], metric,
+                                         palette[j % len(palette)], low[:, j], high[:, j]))
     return fig
+
+if CLIENT_TRACES:
+    @app.callback(
+        Output('trial-columns', 'data'),
+        Input('trial-request', 'data'),
+        prevent_initial_call=True
+    )
+    def send_trial_columns(fnames):
+        # Add only the newly requested trials to the browser's store
+        patch = Patch()
+        for fname in fnames:
+            df = load_trial(fname)
+            patch[fname] = pack_columns(df, [m for m in all_metrics if m in df.columns])
+        return patch
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='traces', function_name='request'),
+        Output('trial-request', 'data'),
+        Input('file-checklist', 'value'),
+        State('trial-columns', 'data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='traces', function_name='render'),
+        Output('kinematic-plot', 'figure'),
+        [Input('file-checklist', 'value')] +
+        [Input(f"{group.lower()}-metrics", 'value') for group in metric_groups.keys()] +
+        [Input('time-mode', 'value'), Input('trial-columns', 'data')],
+        State('client-trace-config', 'data')
+    )
+else:
+    app.callback(
+        Output('kinematic-plot', 'figure'),
+        Output('plotted-traces', 'data'),
+        Output('plot-window', 'data'),
+        [Input('file-checklist', 'value')] +
+        [Input(f"{group.lower()}-metrics", 'value') for group in metric_groups.keys()] +
+        [Input('time-mode', 'value'), Input('plot-view', 'value'), Input('kinematic-plot', 'relayoutData')],
+        State('plotted-traces', 'data'),
+        State('plot-window', 'data')
+    )(update_plot)
+
+@app.callback(
+    Output('playback-data', 'data'),
+    Output('playback-slider', 'max'),
+    Output('playback-slider', 'value'),
+    Input('playback-file', 'value')
+)
+def load_playback(fname):
+    if not fname:
+        return None, 0, 0
+    df = load_trial(fname)
+    return pack_columns(df), max(len(df) - 1, 0), 0
+
+app.clientside_callback(
+    ClientsideFunction(namespace='playback', function_name='files'),
+    Output('playback-file', 'options'),
+    Output('playback-file', 'value'),
+    Input('file-checklist', 'value'),
+    State('playback-file', 'value')
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='playback', function_name='toggle'),
+    Output('playback-interval', 'disabled'),
+    Output('playback-play', 'children'),
+    Input('playback-play', 'n_clicks'),
+    State('playback-interval', 'disabled')
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='playback', function_name='advance'),
+    Output('playback-slider', 'value', allow_duplicate=True),
+    Input('playback-interval', 'n_intervals'),
+    State('playback-slider', 'value'),
+    State('playback-interval', 'interval'),
+    State('playback-data', 'data'),
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='playback', function_name='seek'),
+    Output('playback-readout', 'children'),
+    Output('playback-pose', 'children'),
+    Input('playback-slider', 'value'),
+    Input('playback-data', 'data'),
+    Input('time-mode', 'value'),
+    Input('kinematic-plot', 'figure')
+)
+
+if live is not None:
+    @app.callback(
+        Output('live-plot', 'extendData'),
+        Output('live-position', 'data'),
+        Input('live-interval', 'n_intervals'),
+        State('live-position', 'data')
+    )
+    def extend_live_plot(_, seen):
+        live.start()
+        seen = seen or {'position': 0, 'session': 0}
+        # Append only the frames this browser has not seen yet
+        times, angles, position, session = live.since(seen['position'])
+        if len(times) == 0:
+            return no_update, {'position': position, 'session': seen['session']}
+        n = len(LIVE_ANGLES)
+        data = dict(x=[times.tolist()] * n, y=[angles[:, i].tolist() for i in range(n)])
+        # A new recording replaces the previous one's points instead of extending them
+        max_points = LIVE_PLOT_POINTS if session == seen['session'] else len(times)
+        return (data, list(range(n)), max_points), {'position': position, 'session': session}
+
 if __name__ == "__main__":
     # Uncomment the following lines to run on a server or cloud platform
     port = int(os.environ.get("PORT", 8050))
-    app.run(debug=True, host="0.0.0.0", port=port)  # Run the app on all interfaces
+    app.run(debug=DEBUG, host="0.0.0.0", port=port)  # Run the app on all interfaces
 
     # local run
     # app.run(debug=True)
\ No newline at end of file
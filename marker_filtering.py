@@ -0,0 +1,180 @@
+import numpy as np
+
+# Default preprocessing of marker trajectories:
+#   max_gap: longest run of missing samples (seconds) filled by linear interpolation
+#   cutoff: low-pass cutoff frequency (Hz); None skips filtering
+#   order: Butterworth order; the filter is applied forwards and backwards
+#          (zero lag), so the magnitude response is that of 2 * order
+DEFAULT_FILTER = dict(max_gap=0.2, cutoff=6.0, order=4)
+
+# Per-movement overrides, picked by the movement word in the file name
+FILTER_OVERRIDES = {
+    'sprint': dict(cutoff=10.0),
+}
+
+
+def fill_gaps(data, max_gap=None):
+    """
+    Linearly interpolate runs of NaN along axis 0 of a (samples, channels)
+    array, for all channels at once.
+
+    Parameters:
+    data (ndarray): 2-D array; NaN marks missing samples.
+    max_gap (int): Longest run (samples) to fill. None fills every interior
+        gap. Gaps touching either end are never filled.
+
+    Returns:
+    ndarray: Copy of data with the gaps filled.
+    """
+    data = np.array(data, dtype=np.float64)
+    missing = np.isnan(data)
+    if not missing.any():
+        return data
+    n = data.shape[0]
+    rows = np.arange(n)[:, None]
+    # Last valid sample at or before, and first valid sample at or after, each sample
+    before = np.maximum.accumulate(np.where(missing, -1, rows), axis=0)
+    after = np.minimum.accumulate(np.where(missing, n, rows)[::-1], axis=0)[::-1]
+    fill = missing & (before >= 0) & (after < n)
+    if max_gap is not None:
+        fill &= (after - before - 1) <= max_gap
+    if not fill.any():
+        return data
+    left = np.take_along_axis(data, np.clip(before, 0, n - 1), axis=0)
+    right = np.take_along_axis(data, np.clip(after, 0, n - 1), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = (rows - before) / (after - before)
+    data[fill] = (left + weight * (right - left))[fill]
+    return data
+
+
+def lowpass(data, rate, cutoff, order=4):
+    """
+    Zero-lag Butterworth low-pass along axis 0 of a (samples, channels) array.
+
+    Applied in the frequency domain with the squared Butterworth magnitude
+    1 / (1 + (f / cutoff) ** (2 * order)), which is the response of a
+    forward-backward (filtfilt) pass of the order-`order` filter. Both ends
+    are extended by odd reflection to limit edge effects. Channels with NaN
+    are filtered with their gaps bridged and the NaN restored afterwards.
+
+    Parameters:
+    data (ndarray): 2-D array of samples.
+    rate (float): Sampling rate in Hz (the TRC DataRate).
+    cutoff (float): Cutoff frequency in Hz.
+    order (int): Butterworth order.
+
+    Returns:
+    ndarray: Filtered copy of data.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    n = data.shape[0]
+    if n < 3 or cutoff is None or cutoff >= rate / 2:
+        return data.copy()
+    missing = np.isnan(data)
+    work = data
+    if missing.any():
+        # Bridge interior gaps and hold the first/last valid value over gaps
+        # at the ends; all-NaN channels become 0
+        work = fill_gaps(data)
+        valid = ~np.isnan(work)
+        first = valid.argmax(axis=0)
+        last = n - 1 - valid[::-1].argmax(axis=0)
+        cols = np.arange(work.shape[1])
+        rows = np.arange(n)[:, None]
+        work = np.where(rows < first, work[first, cols], work)
+        work = np.where(rows > last, work[last, cols], work)
+        work = np.nan_to_num(work)
+
+    pad = min(n - 1, int(np.ceil(3 * rate / cutoff)))
+    head = 2 * work[:1] - work[pad:0:-1]
+    tail = 2 * work[-1:] - work[-2:-pad - 2:-1]
+    extended = np.concatenate([head, work, tail])
+    freqs = np.fft.rfftfreq(extended.shape[0], d=1.0 / rate)
+    gain = 1.0 / (1.0 + (freqs / cutoff) ** (2 * order))
+    filtered = np.fft.irfft(np.fft.rfft(extended, axis=0) * gain[:, None], n=extended.shape[0], axis=0)
+    filtered = filtered[pad:pad + n]
+    filtered[missing] = np.nan
+    return filtered
+
+
+def filter_settings(path=None, **overrides):
+    """
+    Filter settings for a trial: DEFAULT_FILTER, then the overrides of the
+    movement in its file name, then explicit overrides.
+    """
+    from segmentation import movement_of
+
+    settings = dict(DEFAULT_FILTER)
+    if path is not None:
+        settings.update(FILTER_OVERRIDES.get(movement_of(path), {}))
+    settings.update(overrides)
+    return settings
+
+
+def filter_columns(data, rate, settings=None):
+    """
+    Gap-fill then low-pass a (samples, channels) array with the given settings.
+
+    Parameters:
+    data (ndarray): 2-D array; NaN marks missing samples.
+    rate (float): Sampling rate in Hz.
+    settings (dict): Keys of DEFAULT_FILTER. Defaults to DEFAULT_FILTER.
+
+    Returns:
+    ndarray: Filtered copy of data.
+    """
+    settings = {**DEFAULT_FILTER, **(settings or {})}
+    max_gap = settings['max_gap']
+    data = fill_gaps(data, None if max_gap is None else int(round(max_gap * rate)))
+    if settings['cutoff'] is not None:
+        data = lowpass(data, rate, settings['cutoff'], settings['order'])
+    return data
+
+
+def filter_markers(data, rate, settings=None):
+    """
+    Gap-fill and low-pass every marker axis of a trial as one 2-D array.
+
+    Parameters:
+    data (ndarray): Marker positions shaped (frames, markers, 3).
+    rate (float): Sampling rate in Hz.
+    settings (dict): Keys of DEFAULT_FILTER. Defaults to DEFAULT_FILTER.
+
+    Returns:
+    ndarray: Filtered positions, same shape as data.
+    """
+    flat = np.asarray(data, dtype=np.float64).reshape(data.shape[0], -1)
+    return filter_columns(flat, rate, settings).reshape(data.shape)
+
+
+def filter_trial(trial, settings=None):
+    """
+    Filtered copy of a TRCTrial, using its DataRate header.
+    """
+    from dataclasses import replace
+
+    settings = settings or filter_settings(trial.path)
+    data = filter_markers(trial.data, trial.data_rate, settings).astype(trial.data.dtype, copy=False)
+    return replace(trial, data=data)
+
+
+def load_filtered(path, settings=None):
+    """
+    Filtered TRC trial, computed once and stored in the trial cache next to
+    the parsed trial (recomputed when the file or settings change).
+
+    Parameters:
+    path (str): TRC file.
+    settings (dict): Filter settings. Defaults to filter_settings(path).
+
+    Returns:
+    TRCTrial: The trial with memory-mapped filtered marker data.
+    """
+    from dataclasses import replace
+    from trial_cache import load_derived, load_trc
+
+    settings = settings or filter_settings(path)
+    trial = load_trc(path)
+    arrays = load_derived(path, 'filtered', settings, lambda: {'data': filter_trial(trial, settings).data})
+    return replace(trial, data=arrays['data'])
@@ -0,0 +1,238 @@
+import functools
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+# Model used by the dashboard to build and check its metric groups
+DEFAULT_MODEL = "OSIMs/scaled.osim"
+
+# Joint types whose single coordinate is a translation (every other
+# non-CustomJoint coordinate is a rotation)
+TRANSLATIONAL_JOINTS = {'SliderJoint'}
+
+
+@dataclass(frozen=True)
+class Coordinate:
+    """
+    A generalized coordinate of the model.
+
+    Attributes:
+    name (str): Coordinate name, which is also its column name in a .sto file.
+    joint (str): Joint the coordinate belongs to.
+    motion (str): 'rotational' or 'translational'.
+    units (str): 'deg' for rotations (as written to .sto files with
+        inDegrees=yes), 'm' for translations.
+    range (tuple): (min, max) in `units`.
+    default_value (float): Default value in `units`.
+    locked (bool): Whether the coordinate is locked in the model.
+    """
+    name: str
+    joint: str
+    motion: str
+    units: str
+    range: tuple
+    default_value: float = 0.0
+    locked: bool = False
+
+
+@dataclass(frozen=True)
+class Joint:
+    """
+    A joint connecting a parent body to a child body.
+
+    Attributes:
+    name (str): Joint name.
+    type (str): OpenSim joint class (CustomJoint, WeldJoint, PinJoint, ...).
+    parent (str): Parent body name ('ground' for the root).
+    child (str): Child body name.
+    coordinates (tuple): Names of the joint's coordinates.
+    """
+    name: str
+    type: str
+    parent: str
+    child: str
+    coordinates: tuple = ()
+
+
+@dataclass
+class OsimModel:
+    """
+    Model metadata read from an .osim file: bodies, joints and coordinates.
+    """
+    name: str
+    path: str
+    bodies: tuple
+    joints: dict = field(default_factory=dict)
+    coordinates: dict = field(default_factory=dict)
+
+    def parent_body(self, coordinate):
+        """
+        Parent body of the joint a coordinate belongs to.
+        """
+        return self.joints[self.coordinates[coordinate].joint].parent
+
+    def children(self, body):
+        """
+        Bodies attached to `body` by a joint.
+        """
+        return [joint.child for joint in self.joints.values() if joint.parent == body]
+
+    def chain(self, body):
+        """
+        Joints from the ground down to `body`, root first.
+        """
+        by_child = {joint.child: joint for joint in self.joints.values()}
+        chain = []
+        while body in by_child:
+            joint = by_child[body]
+            chain.append(joint.name)
+            body = joint.parent
+        return chain[::-1]
+
+    def metric_groups(self):
+        """
+        Dashboard metric groups generated from the joint tree: the
+        coordinates of every joint, grouped by the child body with its side
+        suffix removed (femur_r and femur_l -> 'Femur'), in model order.
+
+        Returns:
+        dict: Group name -> list of coordinate names.
+        """
+        groups = {}
+        for joint in self.joints.values():
+            if joint.coordinates:
+                groups.setdefault(_group_name(joint.child), []).extend(joint.coordinates)
+        return groups
+
+    def check_columns(self, columns):
+        """
+        Compare the columns of a .sto file with the model's coordinates.
+
+        Returns:
+        dict: 'missing' - coordinates with no column, 'unknown' - columns
+        (other than time) that are not coordinates of the model.
+        """
+        columns = [c for c in columns if c != 'time']
+        present = set(columns)
+        return {
+            'missing': [name for name in self.coordinates if name not in present],
+            'unknown': [c for c in columns if c not in self.coordinates],
+        }
+
+
+def _group_name(body):
+    # Strip side suffixes: femur_r, humerus_R, sternumR -> femur, humerus, sternum
+    base = re.sub(r'(_[rlRL]|(?<=[a-z])[RL])$', '', body)
+    return base.title()
+
+
+def _frame_parents(joint):
+    """
+    Offset frame name -> body path for the frames declared inside a joint.
+    """
+    frames = {}
+    for frame in joint.iter('PhysicalOffsetFrame'):
+        frames[frame.get('name')] = (frame.findtext('socket_parent') or '').strip()
+    return frames
+
+
+def _body_name(socket, frames):
+    # Sockets point at an offset frame of the joint or directly at a body path
+    target = frames.get(socket, socket)
+    return target.rsplit('/', 1)[-1]
+
+
+def _coordinate_motion(joint):
+    """
+    Coordinate name -> 'rotational'/'translational' for one joint. In a
+    CustomJoint the first transform axis a coordinate drives decides it.
+    """
+    motion = {}
+    transform = joint.find('SpatialTransform')
+    if transform is not None:
+        for axis in transform.findall('TransformAxis'):
+            kind = 'rotational' if axis.get('name', '').startswith('rotation') else 'translational'
+            for name in (axis.findtext('coordinates') or '').split():
+                motion.setdefault(name, kind)
+    return motion
+
+
+def _parse_joint(joint):
+    frames = _frame_parents(joint)
+    parent = _body_name((joint.findtext('socket_parent_frame') or '').strip(), frames)
+    child = _body_name((joint.findtext('socket_child_frame') or '').strip(), frames)
+    motion = _coordinate_motion(joint)
+    default_motion = 'translational' if joint.tag in TRANSLATIONAL_JOINTS else 'rotational'
+
+    coordinates = []
+    for element in joint.iter('Coordinate'):
+        name = element.get('name')
+        kind = motion.get(name, default_motion)
+        scale = math.degrees(1) if kind == 'rotational' else 1.0
+        low, high = (float(v) * scale for v in (element.findtext('range') or '0 0').split())
+        coordinates.append(Coordinate(
+            name=name,
+            joint=joint.get('name'),
+            motion=kind,
+            units='deg' if kind == 'rotational' else 'm',
+            range=(low, high),
+            default_value=float(element.findtext('default_value') or 0.0) * scale,
+            locked=(element.findtext('locked') or 'false').strip() == 'true',
+        ))
+    return Joint(joint.get('name'), joint.tag, parent, child, tuple(c.name for c in coordinates)), coordinates
+
+
+def _parse_osim(path):
+    """
+    Stream an .osim file, keeping only the body and joint sets.
+
+    Elements are cleared as soon as they are read and parsing stops after
+    the JointSet, so the (large) force and marker sets are never built.
+    """
+    name = None
+    bodies, joints, coordinates = [], {}, {}
+    stack = []
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element.tag)
+            if element.tag == 'Model' and name is None:
+                name = element.get('name')
+            continue
+        stack.pop()
+        # Direct children of <BodySet><objects> and <JointSet><objects>
+        if len(stack) >= 2 and stack[-1] == 'objects':
+            if stack[-2] == 'BodySet':
+                bodies.append(element.get('name'))
+                element.clear()
+            elif stack[-2] == 'JointSet':
+                joint, joint_coordinates = _parse_joint(element)
+                joints[joint.name] = joint
+                coordinates.update((c.name, c) for c in joint_coordinates)
+                element.clear()
+        elif element.tag == 'JointSet':
+            break
+    return OsimModel(name=name, path=path, bodies=tuple(bodies), joints=joints, coordinates=coordinates)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_osim_cached(path, size, mtime_ns):
+    return _parse_osim(path)
+
+
+def read_osim(path=DEFAULT_MODEL):
+    """
+    Read the bodies, joints and coordinates of an OpenSim model without
+    importing opensim.
+
+    Results are cached per file and re-read when the file changes.
+
+    Parameters:
+    path (str): Path to the .osim file.
+
+    Returns:
+    OsimModel: The model metadata.
+    """
+    stat = os.stat(path)
+    return _read_osim_cached(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
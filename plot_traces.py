@@ -0,0 +1,165 @@
+import base64
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from downsample import LODPyramid
+
+# --- CONFIGURATION ---
+# Traces with more points than this are drawn with WebGL (scattergl) instead of SVG
+GL_POINT_THRESHOLD = int(os.environ.get("GL_POINT_THRESHOLD", 5000))
+# Number of (file, metric) trace payloads memoized server-side
+TRACE_CACHE_SIZE = int(os.environ.get("TRACE_CACHE_SIZE", 1024))
+
+
+def encode_array(values):
+    """
+    Encode an array as a plotly.js typed-array spec ({'dtype': 'f4', 'bdata': base64}),
+    which is a quarter of the size of the same samples written as JSON numbers.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    return {'dtype': 'f4', 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def pack_columns(df, columns=None):
+    """
+    Pack a trial's 'time' column and the chosen columns (default: all others)
+    as float32 typed-array specs for the browser.
+
+    Returns:
+    dict: {'n': frames, 'columns': [...], 'time': spec, 'values': spec of the
+    (frames, columns) block in row-major order}.
+    """
+    if columns is None:
+        columns = [c for c in df.columns if c != 'time']
+    return {
+        'n': len(df),
+        'columns': list(columns),
+        'time': encode_array(df['time'].to_numpy()),
+        'values': encode_array(df[list(columns)].to_numpy(dtype=np.float32)),
+    }
+
+
+def file_identity(path):
+    """
+    Identity of a file's current contents: (absolute path, size, mtime_ns).
+    """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def trace_name(fname, metric):
+    return f"{metric} - {fname}"
+
+
+def build_trace(x, y, name):
+    """
+    Build a plotly trace dict for one curve, switching to scattergl past
+    GL_POINT_THRESHOLD points.
+    """
+    return {
+        'type': 'scattergl' if len(x) > GL_POINT_THRESHOLD else 'scatter',
+        'mode': 'lines',
+        'name': name,
+        'x': encode_array(x),
+        'y': encode_array(y),
+    }
+
+
+def _rgba(color, alpha):
+    color = color.lstrip('#')
+    r, g, b = (int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return f"rgba({r}, {g}, {b}, {alpha})"
+
+
+def build_band_traces(x, center, lower, upper, name, color, low=None, high=None):
+    """
+    Build the traces of one aggregated curve: an optional light low/high
+    envelope, a shaded lower-upper band and the center line, all in one
+    legend group so clicking the legend entry toggles the whole band.
+
+    Parameters:
+    x (ndarray): Grid shared by the curves.
+    center, lower, upper (ndarray): Center line and band limits.
+    name (str): Legend label.
+    color (str): '#rrggbb' line color; fills use it with transparency.
+    low, high (ndarray): Optional outer envelope (e.g. min/max).
+
+    Returns:
+    list: Trace dicts.
+    """
+    common = {'type': 'scatter', 'mode': 'lines', 'x': encode_array(x), 'legendgroup': name,
+              'showlegend': False, 'hoverinfo': 'skip'}
+    edge = {'width': 0}
+    traces = []
+    if low is not None and high is not None:
+        traces.append({**common, 'y': encode_array(low), 'line': edge})
+        traces.append({**common, 'y': encode_array(high), 'line': edge, 'fill': 'tonexty',
+                       'fillcolor': _rgba(color, 0.1)})
+    traces.append({**common, 'y': encode_array(lower), 'line': edge})
+    traces.append({**common, 'y': encode_array(upper), 'line': edge, 'fill': 'tonexty',
+                   'fillcolor': _rgba(color, 0.3)})
+    traces.append({'type': 'scatter', 'mode': 'lines', 'name': name, 'x': encode_array(x),
+                   'y': encode_array(center), 'legendgroup': name, 'line': {'color': color}})
+    return traces
+
+
+class TraceCache:
+    """
+    Memoizes per-(file, metric) trace payloads, keyed on the file's identity
+    so an edited file is re-read instead of served stale.
+
+    Each entry holds the curve's LODPyramid and its full-range trace reduced
+    to screen resolution; a zoomed window is a slice of the pyramid.
+
+    Parameters:
+    loader (callable): fname -> DataFrame with a 'time' column.
+    path_of (callable): fname -> path on disk, used for the file identity.
+    maxsize (int): Number of payloads kept.
+    """
+
+    def __init__(self, loader, path_of, maxsize=TRACE_CACHE_SIZE):
+        self.loader = loader
+        self.path_of = path_of
+        self.maxsize = maxsize
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, fname, metric):
+        key = (file_identity(self.path_of(fname)), metric)
+        with self._lock:
+            if key in self._payloads:
+                self._payloads.move_to_end(key)
+                return self._payloads[key]
+        df = self.loader(fname)
+        if metric not in df.columns:
+            return None
+        pyramid = LODPyramid(df['time'].to_numpy(), df[metric].to_numpy())
+        entry = (pyramid, build_trace(*pyramid.window(), trace_name(fname, metric)))
+        with self._lock:
+            self._payloads[key] = entry
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+        return entry
+
+    def get(self, fname, metric, x_range=None):
+        """
+        Return the trace dict for a metric of a file, or None if the file has
+        no such column.
+
+        Parameters:
+        fname (str): File name.
+        metric (str): Column name.
+        x_range (tuple): Optional (x0, x1) time window. The trace then holds
+            that window at the finest level of detail that fits the screen;
+            otherwise it is the full curve at screen resolution.
+        """
+        entry = self._entry(fname, metric)
+        if entry is None:
+            return None
+        pyramid, trace = entry
+        if x_range is None:
+            return trace
+        return build_trace(*pyramid.window(*x_range), trace_name(fname, metric))
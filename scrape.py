@@ -1,11 +1,48 @@
-import requests
-from bs4 import BeautifulSoup
+"""
+Injury transaction scraper for prosportstransactions.com search results.
+
+Result pages are fetched concurrently over a pooled keep-alive session with
+retries, timeouts and a shared rate limit. Full pages are cached on disk so
+re-runs only fetch the pages that can still change (the last partial page
+and anything after it), and an interrupted crawl resumes from its checkpoint.
+
+Example:
+    python scrape.py
+    python scrape.py --injury "achilles" --sport football --out achilles_by_year.csv
+    python scrape.py --base-url http://127.0.0.1:8000 --workers 2
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import csv
+from urllib.parse import urlencode
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Base URL and search parameters
-BASE_URL = "https://www.prosportstransactions.com/basketball/Search/SearchResults.php"
+# --- CONFIGURATION ---
+# Site root; point it at a local stand-in server for testing
+BASE_URL = os.environ.get("SCRAPE_BASE_URL", "https://www.prosportstransactions.com")
+# Rows per result page (the site's fixed page size)
+PAGE_SIZE = 25
+# Concurrent page fetches and the overall request rate they share
+WORKERS = int(os.environ.get("SCRAPE_WORKERS", 4))
+REQUESTS_PER_SECOND = float(os.environ.get("SCRAPE_RATE", 2.0))
+# (connect, read) timeout in seconds and retries per request
+TIMEOUT = (5, 30)
+MAX_RETRIES = 3
+# Raw full result pages and crawl checkpoints
+CACHE_DIR = os.environ.get("SCRAPE_CACHE_DIR", ".scrape_cache")
+
+# Search parameters
 PARAMS = {
     "Player": "",
     "Team": "",
@@ -16,44 +53,249 @@ PARAMS = {
     "Injuries": "acl",
     "Submit": "Search",
     "sort": "0",
-    "start": 0,
 }
 
+
+def search_url(sport="basketball", base_url=None):
+    return f"{(base_url or BASE_URL).rstrip('/')}/{sport}/Search/SearchResults.php"
+
+
+def search_params(injury="acl", begin="2010-01-01", end="2024-12-31"):
+    """
+    Query parameters of an injury search (without the page offset).
+    """
+    return {**PARAMS, "Injuries": injury, "BeginDate": begin, "EndDate": end}
+
+
+def make_session(pool_size=WORKERS, retries=MAX_RETRIES):
+    """
+    Keep-alive session with a connection pool sized for the workers and
+    retries with exponential backoff on connection errors and 429/5xx.
+    """
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RateLimiter:
+    """
+    Spaces requests from all threads at least 1 / rate seconds apart.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageCache:
+    """
+    Raw response bodies on disk, keyed on the full request URL.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = os.path.join(cache_dir, "pages")
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+    def get(self, url):
+        try:
+            with open(self._path(url), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, url, text):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url)
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+def parse_transactions(html):
+    """
+    Parse the rows of a search result page.
+
+    Returns:
+    list: One dict per transaction (date, team, acquired, relinquished, notes).
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    transactions = []
+    for row in soup.select("table.datatable tr")[1:]:
+        cols = [col.get_text(" ", strip=True).lstrip("• ").strip() for col in row.find_all("td")]
+        if not cols:
+            continue
+        cols += [""] * (5 - len(cols))
+        transactions.append(dict(zip(("date", "team", "acquired", "relinquished", "notes"), cols[:5])))
+    return transactions
+
+
+def fetch_page(session, url, params, start, cache=None, limiter=None, timeout=TIMEOUT):
+    """
+    Fetch and parse the result page at offset `start`.
+
+    Full pages are served from / stored in the cache; partial and empty pages
+    are always fetched, since new transactions can still land on them.
+    """
+    page_url = f"{url}?{urlencode({**params, 'start': start})}"
+    html = cache.get(page_url) if cache is not None else None
+    if html is not None:
+        return parse_transactions(html)
+    if limiter is not None:
+        limiter.wait()
+    response = session.get(page_url, timeout=timeout)
+    response.raise_for_status()
+    transactions = parse_transactions(response.text)
+    if cache is not None and len(transactions) >= PAGE_SIZE:
+        cache.put(page_url, response.text)
+    return transactions
+
+
+def _checkpoint_path(cache_dir, url, params):
+    key = hashlib.sha1(json.dumps([url, params], sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_dir, "checkpoints", f"{key}.json")
+
+
+def _load_checkpoint(path):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+        return state["next_start"], state["transactions"]
+    except (OSError, ValueError, KeyError):
+        return 0, []
+
+
+def _save_checkpoint(path, next_start, transactions):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"next_start": next_start, "transactions": transactions}, f)
+    os.replace(tmp, path)
+
+
+def crawl(injury="acl", sport="basketball", begin="2010-01-01", end="2024-12-31", base_url=None,
+          workers=WORKERS, rate=REQUESTS_PER_SECOND, cache_dir=CACHE_DIR, use_cache=True, resume=True):
+    """
+    Fetch every result page of an injury search.
+
+    Pages are requested in waves of `workers` consecutive offsets until a
+    page comes back short. After each wave the transactions so far and the
+    next offset are checkpointed; the checkpoint is removed once the crawl
+    completes.
+
+    Parameters:
+    injury (str): Injury search term ('acl', 'achilles', 'concussion', ...).
+    sport (str): Site section ('basketball', 'football', 'hockey', ...).
+    begin, end (str): Date range as YYYY-MM-DD.
+    base_url (str): Site root. Defaults to BASE_URL.
+    workers (int): Concurrent requests.
+    rate (float): Requests per second across all workers (0 disables).
+    cache_dir (str): Page cache and checkpoint directory.
+    use_cache (bool): Read and write the page cache.
+    resume (bool): Continue from an existing checkpoint.
+
+    Returns:
+    list: Transaction dicts in result order.
+    """
+    url = search_url(sport, base_url)
+    params = search_params(injury, begin, end)
+    checkpoint = _checkpoint_path(cache_dir, url, params)
+    start, transactions = _load_checkpoint(checkpoint) if resume else (0, [])
+    cache = PageCache(cache_dir) if use_cache else None
+    limiter = RateLimiter(rate)
+    workers = max(int(workers), 1)
+
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            starts = [start + i * PAGE_SIZE for i in range(workers)]
+            print(f"Scraping entries {starts[0]} to {starts[-1] + PAGE_SIZE - 1}")
+            pages = list(executor.map(lambda s: fetch_page(session, url, params, s, cache, limiter), starts))
+            done = False
+            for page in pages:
+                transactions.extend(page)
+                start += PAGE_SIZE
+                if len(page) < PAGE_SIZE:
+                    done = True
+                    break
+            if done:
+                break
+            _save_checkpoint(checkpoint, start, transactions)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return transactions
+
+
+def count_by_year(transactions):
+    """
+    Number of transactions per year of their date.
+    """
+    counts = defaultdict(int)
+    for transaction in transactions:
+        try:
+            counts[datetime.strptime(transaction["date"], "%Y-%m-%d").year] += 1
+        except ValueError:
+            continue
+    return dict(sorted(counts.items()))
+
+
+def extract_injuries(injury="acl", sport="basketball", **crawl_kwargs):
+    """
+    Injury counts per year for one injury search term and sport.
+    """
+    return count_by_year(crawl(injury, sport, **crawl_kwargs))
+
+
 def extract_acl_injuries():
-    injury_count_by_year = defaultdict(int)
-    while True:
-        print(f"Scraping entries starting from: {PARAMS['start']}")
-        response = requests.get(BASE_URL, params=PARAMS)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        rows = soup.select("table.datatable tr")[1:]
-        if not rows:
-            break
-
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) < 1:
-                continue
-            date_str = cols[0].get_text(strip=True)
-            try:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                injury_count_by_year[date_obj.year] += 1
-            except ValueError:
-                continue
-
-        PARAMS["start"] += 25
-
-    return dict(sorted(injury_count_by_year.items()))
-
-def export_to_csv(data, filename="acl_injuries_by_year.csv"):
+    return extract_injuries("acl", "basketball")
+
+
+def export_to_csv(data, filename="acl_injuries_by_year.csv", label="ACL Injuries"):
     with open(filename, mode="w", newline="") as file:
         writer = csv.writer(file)
-        writer.writerow(["Year", "ACL Injuries"])
+        writer.writerow(["Year", label])
         for year, count in data.items():
             writer.writerow([year, count])
     print(f"Data exported to {filename}")
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count injury transactions per year.")
+    parser.add_argument("--injury", default="acl", help="injury search term")
+    parser.add_argument("--sport", default="basketball", help="site section, e.g. basketball, football")
+    parser.add_argument("--begin", default=PARAMS["BeginDate"], help="first date (YYYY-MM-DD)")
+    parser.add_argument("--end", default=PARAMS["EndDate"], help="last date (YYYY-MM-DD)")
+    parser.add_argument("--base-url", default=None, help="site root (default: %s)" % BASE_URL)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent requests")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="requests per second (0: no limit)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="page cache and checkpoint directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the page cache")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--out", default=None, help="CSV file (default: <injury>_injuries_by_year.csv)")
+    args = parser.parse_args(argv)
+
+    counts = extract_injuries(args.injury, args.sport, begin=args.begin, end=args.end, base_url=args.base_url,
+                              workers=args.workers, rate=args.rate, cache_dir=args.cache_dir,
+                              use_cache=not args.no_cache, resume=not args.restart)
+    name = args.injury.lower().replace(" ", "_")
+    export_to_csv(counts, args.out or f"{name}_injuries_by_year.csv", f"{args.injury.upper()} Injuries")
+
+
 # Main execution
 if __name__ == "__main__":
-    acl_by_year = extract_acl_injuries()
-    export_to_csv(acl_by_year)
+    main()
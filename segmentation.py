@@ -0,0 +1,312 @@
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Directories searched for the '<trial>_Kinematics_q.sto' of a TRC trial when
+# its movement is segmented on an STO coordinate (besides the TRC's own
+# directory and a sibling STOfiles directory)
+STO_SEARCH_DIRS = [d for d in os.environ.get("SEGMENT_STO_DIRS", "STOfiles").split(os.pathsep) if d]
+
+# One row per repetition/stride: frame bounds (end inclusive), the frame and
+# value of the rep's extreme point, and start time/duration in seconds
+SEGMENT_DTYPE = np.dtype([
+    ('start', np.int32),
+    ('end', np.int32),
+    ('peak', np.int32),
+    ('peak_value', np.float64),
+    ('start_time', np.float64),
+    ('duration', np.float64),
+])
+
+# How to segment each movement, picked by the movement word in the file name.
+#   source: 'sto' coordinate column or 'trc' marker height (Y axis)
+#   extremum: 'min'/'max' extreme that marks each rep (centre) or stride (boundary)
+#   mode: 'around' - each rep is centred on an extremum and bounded by the
+#                    opposite extreme on either side (squat: deepest knee flexion)
+#         'between' - extrema are the boundaries between consecutive segments
+#                     (sprint: heel at its lowest = foot contact)
+#   filtered: (trc only, optional) segment the gap-filled, low-pass filtered
+#             markers of marker_filtering.load_filtered
+SEGMENT_SETTINGS = {
+    'squat': dict(source='sto', signal='knee_angle_r', extremum='min', mode='around',
+                  min_distance=1.0, prominence=30.0),
+    'sprint': dict(source='trc', signal='heel_r', extremum='min', mode='between',
+                   min_distance=0.3, prominence=50.0),
+}
+
+
+def find_extrema(x, kind='max', min_distance=1, prominence=0.0, window=None):
+    """
+    Vectorized local extremum detection.
+
+    Candidates are samples strictly above their left neighbour and not below
+    their right one (for 'max'). Prominence is measured against the lowest
+    sample within `window` samples on each side, computed for all candidates at
+    once with sliding windows. Candidates closer than min_distance samples to a
+    more extreme one are dropped.
+
+    Parameters:
+    x (ndarray): Signal.
+    kind (str): 'max' for peaks, 'min' for valleys.
+    min_distance (int): Minimum samples between kept extrema.
+    prominence (float): Minimum height above the surrounding signal.
+    window (int): Samples on each side used for prominence. Defaults to
+        2 * min_distance.
+
+    Returns:
+    ndarray: Sorted sample indices of the extrema.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if kind == 'min':
+        x = -x
+    elif kind != 'max':
+        raise ValueError(f"Invalid extremum kind: {kind}")
+    x = np.where(np.isnan(x), -np.inf, x)
+    if len(x) < 3:
+        return np.empty(0, dtype=np.intp)
+
+    candidates = np.flatnonzero((x[1:-1] > x[:-2]) & (x[1:-1] >= x[2:])) + 1
+    if len(candidates) == 0:
+        return candidates
+
+    window = max(int(window or 2 * min_distance), 1)
+    padded = np.concatenate([np.full(window, np.inf), x, np.full(window, np.inf)])
+    lows = sliding_window_view(padded, window).min(axis=1)
+    # lows[i] is the minimum of x[i - window:i]; lows[i + window + 1] of x[i + 1:i + window + 1]
+    left = lows[candidates]
+    right = lows[candidates + window + 1]
+    candidates = candidates[x[candidates] - np.maximum(left, right) >= prominence]
+
+    if min_distance > 1 and len(candidates) > 1:
+        # Keep the most extreme candidates first and drop their close neighbours
+        keep = np.ones(len(candidates), dtype=bool)
+        for i in np.argsort(-x[candidates], kind='stable'):
+            if keep[i]:
+                near = np.abs(candidates - candidates[i]) < min_distance
+                near[i] = False
+                keep &= ~near
+        candidates = candidates[keep]
+    return candidates
+
+
+def segment_signal(time, x, extremum='min', mode='around', min_distance=1.0, prominence=0.0):
+    """
+    Split a signal into repetitions or strides.
+
+    Parameters:
+    time (ndarray): Sample times in seconds.
+    x (ndarray): Signal, e.g. knee_angle_r or heel marker height.
+    extremum (str): 'min' or 'max'; see SEGMENT_SETTINGS.
+    mode (str): 'around' or 'between'; see SEGMENT_SETTINGS.
+    min_distance (float): Minimum seconds between extrema.
+    prominence (float): Minimum prominence of an extremum, in signal units.
+
+    Returns:
+    ndarray: Segment index with SEGMENT_DTYPE, one row per segment.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    if len(time) < 2:
+        return np.empty(0, dtype=SEGMENT_DTYPE)
+    dt = np.median(np.diff(time))
+    distance = max(int(round(min_distance / dt)), 1) if dt > 0 else 1
+    extrema = find_extrema(x, extremum, distance, prominence)
+    opposite = np.nanargmax if extremum == 'min' else np.nanargmin
+
+    rows = []
+    if mode == 'around':
+        edges = np.concatenate([[0], extrema, [len(x) - 1]])
+        for i, centre in enumerate(extrema):
+            before, after = edges[i], edges[i + 2]
+            start = before + opposite(x[before:centre + 1])
+            end = centre + opposite(x[centre:after + 1])
+            rows.append((start, end, centre))
+    elif mode == 'between':
+        for start, end in zip(extrema[:-1], extrema[1:]):
+            rows.append((start, end, start + opposite(x[start:end + 1])))
+    else:
+        raise ValueError(f"Invalid segmentation mode: {mode}")
+
+    segments = np.zeros(len(rows), dtype=SEGMENT_DTYPE)
+    if rows:
+        bounds = np.array(rows, dtype=np.intp)
+        segments['start'], segments['end'], segments['peak'] = bounds.T
+        segments['peak_value'] = x[bounds[:, 2]]
+        segments['start_time'] = time[bounds[:, 0]]
+        segments['duration'] = time[bounds[:, 1]] - time[bounds[:, 0]]
+    return segments
+
+
+def movement_of(path):
+    """
+    Movement named in a trial's file name ('squat', 'sprint', ...), or None.
+    """
+    name = os.path.basename(path).lower()
+    return next((movement for movement in SEGMENT_SETTINGS if movement in name), None)
+
+
+def companion_sto(path):
+    """
+    The '<trial>_Kinematics_q.sto' file holding the OpenSim coordinates of a
+    TRC trial (trial names compared case-insensitively), or None.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    here = os.path.dirname(os.path.abspath(path))
+    for directory in [here, os.path.join(os.path.dirname(here), 'STOfiles'), *STO_SEARCH_DIRS]:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.lower() == f'{stem}_kinematics_q.sto':
+                return os.path.join(directory, name)
+    return None
+
+
+def segment_source(path, settings):
+    """
+    File a trial is segmented from: the trial itself, or for a TRC trial with
+    STO-based settings, its companion STO file.
+
+    Raises:
+    LookupError: The trial has no file the settings' signal can be read from.
+    """
+    is_trc = path.lower().endswith('.trc')
+    if settings['source'] == 'trc':
+        if not is_trc:
+            raise LookupError(f"{settings['signal']} is a marker signal; {path} is not a TRC file")
+        return path
+    if not is_trc:
+        return path
+    sto = companion_sto(path)
+    if sto is None:
+        raise LookupError(f"No _Kinematics_q.sto with {settings['signal']} found for {path}")
+    return sto
+
+
+def segment_trial(path, settings=None):
+    """
+    Segment one STO or TRC trial, reading the signal from the source named by
+    the settings (see segment_source).
+
+    Parameters:
+    path (str): STO or TRC file.
+    settings (dict): Entry shaped like SEGMENT_SETTINGS values. Defaults to the
+        settings of the movement in the file name.
+
+    Returns:
+    ndarray: Segment index with SEGMENT_DTYPE.
+    """
+    settings = settings or SEGMENT_SETTINGS.get(movement_of(path))
+    if settings is None:
+        raise ValueError(f"No segmentation settings for {path}")
+    path = segment_source(path, settings)
+    if settings['source'] == 'trc':
+        if settings.get('filtered'):
+            from marker_filtering import load_filtered
+            return segment_marker_trial(load_filtered(path), settings)
+        from trial_cache import load_trc
+        return segment_marker_trial(load_trc(path), settings)
+    from trial_cache import load_sto
+    df, _ = load_sto(path)
+    return segment_signal(df['time'].to_numpy(), df[settings['signal']].to_numpy(), **_signal_params(settings))
+
+
+def _signal_params(settings):
+    return {k: v for k, v in settings.items() if k not in ('source', 'signal', 'filtered')}
+
+
+def segment_marker_trial(trial, settings):
+    """
+    Segment a TRCTrial on the height (Y axis) of the settings' signal marker.
+    """
+    x = trial.marker(settings['signal'])[:, 1]
+    return segment_signal(trial.time, x, **_signal_params(settings))
+
+
+def segment_subjects(trial, settings=None, workers=None):
+    """
+    Segment every person of a multi-subject TRC capture in parallel.
+
+    Parameters:
+    trial (TRCTrial): Parsed trial.
+    settings (dict): TRC-based segmentation settings. Defaults to the
+        settings of the movement in the trial's file name.
+    workers (int): Threads. Defaults to one per subject.
+
+    Returns:
+    dict: Subject label (None for a single-subject trial) -> segment index.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    settings = settings or SEGMENT_SETTINGS.get(movement_of(trial.path))
+    if settings is None or settings['source'] != 'trc':
+        raise ValueError(f"No marker-based segmentation settings for {trial.path}")
+    subjects = trial.subjects()
+    with ThreadPoolExecutor(max_workers=workers or len(subjects)) as executor:
+        indices = executor.map(lambda subject: segment_marker_trial(subject, settings), subjects)
+        return {subject.subject: index for subject, index in zip(subjects, indices)}
+
+
+def load_segments(path, settings=None):
+    """
+    Segment index of a trial, computed once and persisted in the trial cache
+    next to the parsed trial (recomputed when the file or settings change).
+    """
+    from trial_cache import load_derived
+
+    settings = settings or SEGMENT_SETTINGS.get(movement_of(path))
+    if settings is None:
+        raise ValueError(f"No segmentation settings for {path}")
+    # Cached with the file the signal is read from, so it follows that file's changes
+    source = segment_source(path, settings)
+    arrays = load_derived(source, 'segments', settings, lambda: {'segments': segment_trial(source, settings)})
+    return arrays['segments']
+
+
+def segment_library(paths, settings=None):
+    """
+    Segment index of every trial in a library.
+
+    Parameters:
+    paths (list): STO/TRC files.
+    settings (dict): Settings for all trials. Defaults to each file's movement;
+        files whose movement has no settings, or whose settings read a signal
+        the file cannot provide (see segment_source), are skipped.
+
+    Returns:
+    dict: path -> segment index.
+    """
+    index = {}
+    for path in paths:
+        if settings is None and movement_of(path) is None:
+            continue
+        try:
+            index[path] = load_segments(path, settings)
+        except LookupError as exc:
+            print(f"Warning: skipping {path}: {exc}")
+    return index
+
+
+def rep_slice(segments, rep):
+    """
+    Row slice of repetition `rep` (1-based) in a trial, or None if it has fewer reps.
+    """
+    if not 1 <= rep <= len(segments):
+        return None
+    segment = segments[rep - 1]
+    return slice(int(segment['start']), int(segment['end']) + 1)
+
+
+def select_rep(library, rep):
+    """
+    Slice of repetition `rep` in every trial of a segmented library.
+
+    Parameters:
+    library (dict): path -> segment index, from segment_library.
+    rep (int): 1-based repetition number.
+
+    Returns:
+    dict: path -> row slice, for trials with at least `rep` repetitions.
+    """
+    slices = {path: rep_slice(segments, rep) for path, segments in library.items()}
+    return {path: rows for path, rows in slices.items() if rows is not None}
@@ -1,6 +1,156 @@
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass
 
-def process_files(file_paths):
+from instrumentation import instrumented, stage
+
+# Column indexes shared by every compact trial with the same columns (same model)
+_COLUMN_INDEXES = {}
+
+
+def intern_columns(columns):
+    """
+    Return the shared pandas Index for a sequence of column names, creating
+    it on first use, so trials of the same model hold one copy of their labels.
+    """
+    key = tuple(str(c) for c in columns)
+    index = _COLUMN_INDEXES.get(key)
+    if index is None:
+        index = _COLUMN_INDEXES.setdefault(key, pd.Index(key))
+    return index
+
+
+@dataclass
+class STOTrial:
+    """
+    A compact STO trial: every coordinate in one contiguous float32 block.
+
+    float32 keeps about 7 significant digits, i.e. better than 1e-4 degrees
+    for joint angles, at half the memory of float64. time stays float64 so
+    long captures keep exact sample times.
+
+    Attributes:
+    path (str): File the trial was read from.
+    time (ndarray): float64 sample times.
+    values (ndarray): float32 (rows, coordinates) block stored column-major,
+        so each coordinate is a contiguous view.
+    columns (Index): Interned column labels, 'time' first, as in read_sto.
+    header (dict): Header fields (nRows, nColumns, inDegrees, ...).
+    """
+    path: str
+    time: np.ndarray
+    values: np.ndarray
+    columns: pd.Index
+    header: dict
+
+    @classmethod
+    def from_frame(cls, df, header, path=None):
+        """
+        Build a compact trial from a read_sto / load_sto DataFrame.
+        """
+        coordinates = [c for c in df.columns if c != 'time']
+        return cls(
+            path=str(path),
+            time=df['time'].to_numpy(dtype=np.float64),
+            values=np.asfortranarray(df[coordinates].to_numpy(dtype=np.float32)),
+            columns=intern_columns(['time', *coordinates]),
+            header=header,
+        )
+
+    @property
+    def n_rows(self):
+        return self.values.shape[0]
+
+    @property
+    def in_degrees(self):
+        return str(self.header.get('inDegrees', '')).lower() == 'yes'
+
+    @property
+    def nbytes(self):
+        return int(self.time.nbytes + self.values.nbytes)
+
+    def __len__(self):
+        return self.n_rows
+
+    def column(self, name):
+        """
+        Return one column as a view (no copy).
+        """
+        if name == 'time':
+            return self.time
+        return self.values[:, self.columns.get_loc(name) - 1]
+
+    __getitem__ = column
+
+    def to_dataframe(self):
+        """
+        DataFrame over the trial's arrays: the coordinate block is shared, not
+        copied, and the columns are the interned index.
+        """
+        df = pd.DataFrame(self.values, columns=self.columns[1:], copy=False)
+        df.insert(0, 'time', self.time)
+        df.columns = self.columns
+        return df
+
+
+def read_compact_sto(path, use_cache=False):
+    """
+    Read a sto file into an STOTrial.
+    """
+    if use_cache:
+        from trial_cache import load_sto
+        data, header = load_sto(path)
+    else:
+        data, header = read_sto(path)
+    return STOTrial.from_frame(data, header, path)
+
+def read_sto_header(path):
+    """
+    Read the header of a sto file, which ends at the line "endheader".
+
+    Parameters:
+    path (str): Path to the sto file.
+
+    Returns:
+    tuple: (header dict, line number of 'endheader'). The header dict holds the
+    name on the first line under 'name' and every key=value line, with
+    version/nRows/nColumns as ints (e.g. {'name': 'Coordinates', 'nRows': 243,
+    'nColumns': 64, 'inDegrees': 'yes', ...}).
+    """
+    header = {}
+    header_line = None
+    with open(path) as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if 'endheader' in line:
+                header_line = i
+                break
+            if i == 0:
+                header['name'] = line
+            elif '=' in line:
+                key, value = line.split('=', 1)
+                header[key.strip()] = int(value) if value.strip().lstrip('-').isdigit() else value.strip()
+    if header_line is None:
+        raise ValueError(f"No 'endheader' line found in {path}")
+    return header, header_line
+
+def read_sto(path):
+    """
+    Read a sto file into a DataFrame and its header.
+
+    Parameters:
+    path (str): Path to the sto file.
+
+    Returns:
+    tuple: (DataFrame with a 'time' column and one column per coordinate, header dict)
+    """
+    header, header_line = read_sto_header(path)
+    data = pd.read_csv(path, sep='\t', skiprows=header_line + 1, header=0, engine='c')
+    data.columns = [str(c).strip() for c in data.columns]
+    return data, header
+
+@instrumented('process_files')
+def process_files(file_paths, use_cache=False, compact=False):
     """
     Process a list of sto files, 
     read them into a list of DataFrames, 
@@ -8,17 +158,22 @@ def process_files(file_paths):
     
     The DataFrames will contain the kinematic data, including angles.
     Returns a list of DataFrames, one for each file.
+
+    With use_cache=True the parsed files are loaded from the trial_cache
+    binary cache when it is up to date. With compact=True each file is
+    returned as a float32 STOTrial instead of a DataFrame.
     """
     dfs = []  # List to store DataFrames
     for path in file_paths:
-    # Find the line number where 'endheader' appears
-        with open(path) as f:
-            for i, line in enumerate(f):
-                if 'endheader' in line:
-                    header_line = i
-                    break
-
-        data = pd.read_csv(path, sep='\t',header=header_line -1)
+        with stage('process_files.read_sto') as s:
+            if compact:
+                data = read_compact_sto(path, use_cache)
+            elif use_cache:
+                from trial_cache import load_sto
+                data, _ = load_sto(path)
+            else:
+                data, _ = read_sto(path)
+            s.rows = len(data)
         dfs.append((data, path))  # Store tuple of (DataFrame, file name)
 
     return dfs
@@ -36,6 +191,22 @@ def extract_list_of_metrics(df):
     # Assuming the first column is 'time' and the rest are metrics
     return df.columns[1:].tolist()  # Exclude 'time' column
 
+def memory_report(trials):
+    """
+    Bytes held by each trial of process_files output.
+
+    Parameters:
+    trials (list): (DataFrame or STOTrial, path) tuples.
+
+    Returns:
+    dict: path -> bytes, plus 'total'.
+    """
+    report = {}
+    for data, path in trials:
+        report[path] = data.nbytes if isinstance(data, STOTrial) else int(data.memory_usage(index=True).sum())
+    report['total'] = sum(report.values())
+    return report
+
 def static_plot(dfs_with_names, metrics=None):
     """
     Create a static plot of the kinematic curves from the DataFrames to compare across files.
@@ -56,6 +227,31 @@ def static_plot(dfs_with_names, metrics=None):
     plt.legend()
     plt.show()
 
+def band_plot(dfs_with_names, metrics, base='cycle'):
+    """
+    Static plot of the mean ± SD band and min/max envelope of each metric
+    across all files, instead of one curve per file.
+
+    Inputs: dfs_with_names: (DataFrame, file name) tuples from process_files.
+            metrics: List of metric names to aggregate.
+            base: 'cycle' (0-100%) or 'time' (seconds from each trial's start).
+    """
+    import matplotlib.pyplot as plt
+    from ensemble import ensemble
+
+    trials = [df.to_dataframe() if isinstance(df, STOTrial) else df for df, _ in dfs_with_names]
+    grid, stats = ensemble(trials, metrics, base)
+    for j, metric in enumerate(metrics):
+        mean, sd = stats['mean'][:, j], stats['sd'][:, j]
+        line, = plt.plot(grid, mean, label=f"{metric} (n={stats['n'][:, j].max()})")
+        plt.fill_between(grid, mean - sd, mean + sd, color=line.get_color(), alpha=0.3)
+        plt.fill_between(grid, stats['min'][:, j], stats['max'][:, j], color=line.get_color(), alpha=0.1)
+    plt.xlabel("Cycle (%)" if base == 'cycle' else "Time (s)")
+    plt.ylabel("Value")
+    plt.title("Mean ± SD Across Trials")
+    plt.legend()
+    plt.show()
+
 if __name__ == "__main__":
     dfs_with_names = process_files(['STOfiles/0627G1squat_Kinematics_q.sto',
                                     'STOfiles/0627G2squat_Kinematics_q.sto',])
@@ -1,12 +1,17 @@
+from downsample import SCREEN_POINTS, minmax_downsample
+from instrumentation import instrumented, stage
 
 
 
-def read_in_files(file_paths):
+
+def read_in_files(file_paths, use_cache=False):
     """
     Reads in a list of file paths and returns a DataFrame for each file.
     
     Parameters:
     file_paths (list): List of file paths to read.
+    use_cache (bool): Load the trials through the trial_cache binary cache.
+        The DataFrames are then already in the cleaned layout of clip_and_clean.
     
     Returns:
     list: List of DataFrames.
@@ -15,7 +20,11 @@ def read_in_files(file_paths):
     
     dataframes = []
     for path in file_paths:
-        df = pd.read_csv(path, sep='\t', header=[3, 4])
+        if use_cache:
+            from trial_cache import load_trc
+            df = load_trc(path).to_dataframe()
+        else:
+            df = pd.read_csv(path, sep='\t', header=[3, 4])
         dataframes.append(df)
     
     return dataframes
@@ -42,14 +51,31 @@ def clip_and_clean(dataframes):
         # Rebuild the MultiIndex with corrected marker names
         df.columns = pd.MultiIndex.from_arrays([marker_names_filled, coords])
         
-        # Extract the marker names and trim out first two entries which are not markers
-        marker_names = df.columns.get_level_values(0).unique()
-        marker_names = marker_names[2:]  # Assuming first two are not markers
-        
         cleaned_dfs.append(df)
     
     return cleaned_dfs
 
+def filter_marker_columns(dataframes, settings=None):
+    """
+    Gap-fills and low-pass filters the marker columns of cleaned DataFrames,
+    all columns of a trial at once (see marker_filtering).
+
+    Parameters:
+    dataframes (list): DataFrames returned by clip_and_clean.
+    settings (dict): marker_filtering settings. Defaults to DEFAULT_FILTER.
+
+    Returns:
+    list: The DataFrames, filtered in place.
+    """
+    import numpy as np
+    from marker_filtering import filter_columns
+
+    for df in dataframes:
+        time = df.iloc[:, 1].to_numpy(dtype=float)
+        rate = 1.0 / np.median(np.diff(time))
+        df.iloc[:, 2:] = filter_columns(df.iloc[:, 2:].to_numpy(dtype=float), rate, settings)
+    return dataframes
+
 def extract_marker_indices(df):
     """
     Extracts and adjusts the markers for each the dataframe in the list for each marker name
@@ -67,27 +93,40 @@ def extract_marker_indices(df):
     # trim out first two entries which are not markers
     marker_names = marker_names[2:]
     marker_indices = {}
-    for marker in marker_names:
-        index = marker_names.get_loc(marker) + 1  # Adjust for coordinate postfix
+    for index, marker in enumerate(marker_names, start=1):  # Adjust for coordinate postfix
         marker_indices[marker] = {
             'x': f"X{index}",
             'y': f"Y{index}",
             'z': f"Z{index}"
         }
     return marker_indices
+
+def marker_column_positions(df, markers, marker_indices):
+    """
+    Positions of the x, y, z columns of each marker in the DataFrame, resolved
+    in one get_indexer call so the values can be gathered from one array.
+
+    Returns:
+    ndarray: Column positions shaped (len(markers), 3).
+    """
+    keys = [(marker, marker_indices[marker][axis]) for marker in markers for axis in 'xyz']
+    return df.columns.get_indexer(keys).reshape(len(markers), 3)
      
-def extract_coordinates(df, marker):
+def extract_coordinates(df, marker, marker_indices=None):
     """
     Extracts the coordinates for a given marker from the DataFrame.
     
     Parameters:
     df (DataFrame): The DataFrame containing marker data.
     marker (str): The marker name to extract coordinates for.
+    marker_indices (dict): Optional precomputed index from extract_marker_indices;
+        build it once per trial and pass it when extracting several markers.
     
     Returns:
     tuple: Coordinates (x, y, z) of the marker.
     """
-    marker_indices = extract_marker_indices(df)
+    if marker_indices is None:
+        marker_indices = extract_marker_indices(df)
     x_idx = f"{marker_indices[marker]['x']}"
     y_idx = f"{marker_indices[marker]['y']}"
     z_idx = f"{marker_indices[marker]['z']}"
@@ -114,59 +153,109 @@ def calculate_angle(a, b, c):
     angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))  # Clip to avoid NaN due to floating point errors
     return np.degrees(angle)
 
-def calculate_joint_angles(df, angle_types):
+def calculate_joint_angles(df, angle_types, marker_indices=None):
     """
     Calculate angles based on the specified angle type at each row in the DataFrame.
     
     Parameters:
     df (DataFrame): The DataFrame containing marker data.
-    angle_types (list of strings): Type of angle to calculate ('shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle').
+    angle_types (list of strings): Type of angle to calculate, any name in angle_engine.ANGLE_REGISTRY
+        ('shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle', ...).
+    marker_indices (dict): Optional index from extract_marker_indices, built
+        from df when not given.
 
     Returns:
-    float: data frame with field for selected angle
+    float: data frame with field for selected angle (a new frame; use the return value)
     
     """
     import numpy as np
-    
-    # Define the markers for each angle type
-    # The markers are tuples of (marker1, marker2, marker3) where the angle is calculated at marker2
-    # e.g., for 'shoulder', the angle is calculated at 'shoulder_r' using 'hip_r' and 'elbow_r'
-    # The order is important: the angle is calculated at the second marker in the tuple
-    marker_map = {
-        'shoulder': ('hip_r', 'shoulder_r', 'elbow_r'),
-        'knee_l': ('hip_l', 'knee_l', 'ankle_l'),
-        'elbow': ('shoulder_r', 'elbow_r', 'wrist_r'),
-        'wrist': ('elbow_r', 'wrist_r', 'elbow_r'),
-        'hip': ('shoulder_r', 'hip_r', 'knee_r'),
-        'knee_r': ('hip_r', 'knee_r', 'ankle_r'),
-        'ankle': ('knee_r', 'ankle_r', 'foot_r_6'),
-        'foot': ('ankle_r', 'foot_r_6', 'toes_r_6')
-    }
+    from angle_engine import batch_angles, validate_angles
 
-    for angle_type in angle_types:
-        if angle_type not in marker_map:
-            raise ValueError(f"Invalid angle type: {angle_type}")
+    # Nothing to stack; np.stack fails on an empty list
+    if not angle_types:
+        return df
 
-        markers = marker_map[angle_type]
-        X = extract_coordinates(df, markers[0])
-        Y = extract_coordinates(df, markers[1])
-        Z = extract_coordinates(df, markers[2])
-        
-        angles = []
-        for x, y, z in zip(zip(*X), zip(*Y), zip(*Z)):
-            angle = calculate_angle(np.array(x), np.array(y), np.array(z))
-            angles.append(angle)
-        
-        df[f'{angle_type}_angle'] = angles
-    return df
+    # Fail on unknown angle types or missing markers before computing anything
+    if marker_indices is None:
+        marker_indices = extract_marker_indices(df)
+    definitions = validate_angles(angle_types, marker_indices)
+
+    # Resolve the column positions of every marker once, read those columns
+    # into one array and gather the (marker1, marker2, marker3) coordinates of
+    # every angle type as (frames, angles, 3) arrays; all angles are computed
+    # in one batch. The angle is calculated at the second marker in the tuple.
+    markers = list(dict.fromkeys(m for definition in definitions for m in definition.markers))
+    slot = {marker: i for i, marker in enumerate(markers)}
+    columns = marker_column_positions(df, markers, marker_indices)
+    values = df.iloc[:, columns.ravel()].to_numpy(dtype=np.float64).reshape(len(df), len(markers), 3)
+    stacks = [values[:, [slot[definition.markers[position]] for definition in definitions], :]
+              for position in range(3)]
+    angles = batch_angles(*stacks)
+    for i, definition in enumerate(definitions):
+        if definition.supplement:
+            angles[:, i] = 180 - angles[:, i]
+
+    return _with_columns(df, [f'{angle_type}_angle' for angle_type in angle_types], angles)
+
+def calculate_angular_derivatives(df, angle_types, smoothing=None):
+    """
+    Add angular velocity and acceleration of angles computed by
+    calculate_joint_angles, all angles in one array operation.
+
+    Parameters:
+    df (DataFrame): Output of calculate_joint_angles.
+    angle_types (list of strings): Angle types whose '<type>_angle' columns to differentiate.
+    smoothing (dict): Filter settings applied before differentiating (see
+        derivatives.time_derivatives). Defaults to marker_filtering.DEFAULT_FILTER.
+
+    Returns:
+    DataFrame: df with '<type>_angle_vel' (deg/s) and '<type>_angle_acc' (deg/s^2) columns added
+    (a new frame; use the return value)
+    """
+    import numpy as np
+    from derivatives import SUFFIXES, derivative_settings, time_derivatives
+
+    columns = [f'{angle_type}_angle' for angle_type in angle_types]
+    velocity, acceleration = time_derivatives(df.iloc[:, 1].to_numpy(dtype=float), df[columns].to_numpy(dtype=float),
+                                              smoothing or derivative_settings())
+    names = [f'{column}{suffix}' for column in columns for suffix in SUFFIXES]
+    return _with_columns(df, names, np.stack([velocity, acceleration], axis=2).reshape(len(df), -1))
+
+def _with_columns(df, names, block):
+    """
+    df with the columns of block (rows, len(names)) added, or replaced if the
+    names exist, in one concat instead of one insert per column (which
+    fragments wide frames).
+    """
+    import pandas as pd
+
+    if isinstance(df.columns, pd.MultiIndex):
+        # e.g. ('knee_r_angle', '') next to the (marker, coordinate) columns
+        padding = ('',) * (df.columns.nlevels - 1)
+        names = pd.MultiIndex.from_tuples([(name, *padding) for name in names])
+    added = pd.DataFrame(block, index=df.index, columns=names)
+    return pd.concat([df.drop(columns=[c for c in added.columns if c in df.columns]), added], axis=1)
+
+def _plot_points(x, y, max_points):
+    """
+    Reduce a curve to about max_points samples for plotting (None keeps all).
+    """
+    import numpy as np
+
+    x, y = np.asarray(x), np.asarray(y).ravel()
+    if max_points is None:
+        return x, y
+    return minmax_downsample(x, y, max_points)
 
-def plot_joint_angles(df, angle_types):
+def plot_joint_angles(df, angle_types, max_points=SCREEN_POINTS * 2):
     """
     Plot the joint angles over time. all on one figure.
     
     Parameters:
     df (DataFrame): The DataFrame containing marker data with angles.
     angle_types (list of str): Types of angles to plot ['shoulder', 'elbow', 'wrist', 'hip', 'knee', 'ankle'].
+    max_points (int): Longer curves are reduced to about this many points with
+        min/max bucketing, which keeps every peak and valley. None plots every sample.
 
     Returns:
     None
@@ -176,7 +265,8 @@ def plot_joint_angles(df, angle_types):
     plt.figure(figsize=(12, 8))
     for angle_type in angle_types:
         if f'{angle_type}_angle' in df.columns:
-            plt.plot(df.index, df[f'{angle_type}_angle'], label=f'{angle_type} angle')
+            x, y = _plot_points(df.index, df[f'{angle_type}_angle'], max_points)
+            plt.plot(x, y, label=f'{angle_type} angle')
         else:
             print(f"Warning: {angle_type} angle not found in DataFrame.")
 
@@ -187,31 +277,46 @@ def plot_joint_angles(df, angle_types):
     plt.grid()
     plt.show()
 
-def full_pipeline(file_paths, angle_types=['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle','knee_l']):
+@instrumented('full_pipeline')
+def full_pipeline(file_paths, angle_types=['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle','knee_l'],
+                  filtering=None):
     """
     Full processing pipeline: read files, clean data, calculate angles, and plot. Plots all angle types.
 
     Parameters:
     file_paths (list): List of file paths to read.
     angle_types (list of str): Types of angles to calculate and plot.
+    filtering (dict): Marker filter settings (see marker_filtering); None skips filtering.
 
     Returns:
     None
     """
-    dfs = read_in_files(file_paths)
-    cleaned_dfs = clip_and_clean(dfs)
+    with stage('full_pipeline.read_in_files') as s:
+        dfs = read_in_files(file_paths)
+        s.rows = sum(len(df) for df in dfs)
+    with stage('full_pipeline.clip_and_clean', s.rows):
+        cleaned_dfs = clip_and_clean(dfs)
+    if filtering is not None:
+        with stage('full_pipeline.filter_markers', s.rows):
+            filter_marker_columns(cleaned_dfs, filtering)
 
     for df in cleaned_dfs:
-        df = calculate_joint_angles(df, angle_types)
-        plot_joint_angles(df, angle_types)
+        with stage('full_pipeline.calculate_joint_angles', len(df)):
+            df = calculate_joint_angles(df, angle_types)
+        with stage('full_pipeline.plot_joint_angles', len(df)):
+            plot_joint_angles(df, angle_types)
 
-def multiple_pipeline(file_paths, angle_types=['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle','knee_l']):
+@instrumented('multiple_pipeline')
+def multiple_pipeline(file_paths, angle_types=['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle','knee_l'],
+                      max_points=SCREEN_POINTS * 2, filtering=None):
     """
     Process multiple files and plot angles from each file in a single figure.
     
     Parameters:
     file_paths (list): List of file paths to read.
     angle_types (list of str): Types of angles to calculate and plot.
+    max_points (int): Points per curve after min/max downsampling (None for all).
+    filtering (dict): Marker filter settings (see marker_filtering); None skips filtering.
 
     Returns:
     None
@@ -221,15 +326,24 @@ def multiple_pipeline(file_paths, angle_types=['shoulder', 'elbow', 'wrist', 'hi
     plt.figure(figsize=(12, 8))
     
     for path in file_paths:
-        df = read_in_files([path])[0]  # Read the first DataFrame from the file
-        df = clip_and_clean([df])[0]  # Clean the DataFrame
-        df = calculate_joint_angles(df, angle_types)  # Calculate angles
+        with stage('multiple_pipeline.read_in_files') as s:
+            df = read_in_files([path])[0]  # Read the first DataFrame from the file
+            s.rows = len(df)
+        with stage('multiple_pipeline.clip_and_clean', len(df)):
+            df = clip_and_clean([df])[0]  # Clean the DataFrame
+        if filtering is not None:
+            with stage('multiple_pipeline.filter_markers', len(df)):
+                filter_marker_columns([df], filtering)
+        with stage('multiple_pipeline.calculate_joint_angles', len(df)):
+            df = calculate_joint_angles(df, angle_types)  # Calculate angles
         
-        for angle_type in angle_types:
-            if f'{angle_type}_angle' in df.columns:
-                plt.plot(df.index, df[f'{angle_type}_angle'], label=f'{angle_type} angle - {path}')
-            else:
-                print(f"Warning: {angle_type} angle not found in DataFrame for {path}.")
+        with stage('multiple_pipeline.plot', len(df)):
+            for angle_type in angle_types:
+                if f'{angle_type}_angle' in df.columns:
+                    x, y = _plot_points(df.index, df[f'{angle_type}_angle'], max_points)
+                    plt.plot(x, y, label=f'{angle_type} angle - {path}')
+                else:
+                    print(f"Warning: {angle_type} angle not found in DataFrame for {path}.")
 
     plt.xlabel('Time')
     plt.ylabel('Angle (degrees)')
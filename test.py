@@ -85,27 +85,19 @@ hip = df[('hip_r', x_hip_idx)].values, df[('hip_r', y_hip_idx)].values, df[('hip
 knee = df[('knee_r', x_knee_idx)].values, df[('knee_r', y_knee_idx)].values, df[('knee_r', z_knee_idx)].values
 ankle = df[('ankle_r', x_ankle_idx)].values, df[('ankle_r', y_ankle_idx)].values, df[('ankle_r', z_ankle_idx)].values
 
-# Calculate angles
-angles = []
-for s, e, w in zip(zip(*shoulder), zip(*elbow), zip(*wrist)):
-    angle = calculate_angle(np.array(s), np.array(e), np.array(w))
-    angles.append(angle)    
+# Calculate angles for all frames at once
+from angle_engine import batch_angles
+shoulder, elbow, wrist = np.column_stack(shoulder), np.column_stack(elbow), np.column_stack(wrist)
+hip, knee, ankle, foot = np.column_stack(hip), np.column_stack(knee), np.column_stack(ankle), np.column_stack(foot)
+
 # Add angles to the DataFrame
-df['elbow_angle'] = angles
+df['elbow_angle'] = batch_angles(shoulder, elbow, wrist)
 
 # Add hip, knee, and ankle angles
-knee_angles = []
-for h, k, a in zip(zip(*hip), zip(*knee), zip(*ankle)):
-    angle = calculate_angle(np.array(h), np.array(k), np.array(a))
-    knee_angles.append(angle)
-df['knee_angle'] = knee_angles
+df['knee_angle'] = batch_angles(hip, knee, ankle)
 
 # Add foot angle
-foot_angles = []
-for f, k, a in zip(zip(*knee), zip(*ankle), zip(*foot)):
-    angle = 180-calculate_angle(np.array(f), np.array(k), np.array(a))
-    foot_angles.append(angle)
-df['foot_angle'] = foot_angles
+df['foot_angle'] = 180 - batch_angles(knee, ankle, foot)
 
 # create simple graph of elbow angle and knee angle
 import matplotlib.pyplot as plt
@@ -1,7 +1,14 @@
-import opensim as osim
+from osim_reader import DEFAULT_MODEL, read_osim
 
-# Load a model
-model = osim.Model('OSIMs/scaled.osim')
+# Read the model's metadata without loading the OpenSim runtime
+model = read_osim(DEFAULT_MODEL)
 
 # Print model info
-print(model.getName())
\ No newline at end of file
+print(model.name)
+print(f"{len(model.bodies)} bodies, {len(model.joints)} joints, {len(model.coordinates)} coordinates")
+
+
+def load_opensim_model(path=DEFAULT_MODEL):
+    # Only simulations need the full OpenSim model
+    import opensim as osim
+    return osim.Model(path)
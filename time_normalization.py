@@ -0,0 +1,203 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Samples on the 0-100% cycle grid (every 1%)
+CYCLE_POINTS = 101
+
+
+def _stack(trials, columns):
+    """
+    Stack the 'time' column and the chosen columns of every trial into padded
+    arrays: times (trials, max_len) and values (trials, max_len, columns).
+    Padding repeats each trial's last sample; max_len is at least 2 so every
+    trial has a right neighbour to interpolate towards (single-frame trials
+    then match only at their one sample time).
+    """
+    lengths = np.array([len(df) for df in trials])
+    max_len = max(lengths.max(), 2) if len(lengths) else 0
+    times = np.empty((len(trials), max_len))
+    values = np.empty((len(trials), max_len, len(columns)))
+    for i, df in enumerate(trials):
+        n = lengths[i]
+        times[i, :n] = df['time'].to_numpy()
+        values[i, :n] = df[list(columns)].to_numpy(dtype=np.float64)
+        times[i, n:] = times[i, n - 1] if n else np.nan
+        values[i, n:] = values[i, n - 1] if n else np.nan
+    return times, values, lengths
+
+
+def resample(trials, columns, grids):
+    """
+    Linearly interpolate the chosen columns of every trial onto per-trial
+    sample times, as one gather + lerp over all columns of all trials.
+
+    Parameters:
+    trials (list of DataFrame): Trials with a 'time' column (STO frames or
+        angle tables from angle_engine.compute_angles).
+    columns (list of str): Columns to resample.
+    grids (ndarray): Sample times per trial, shaped (trials, points). Times
+        outside a trial give NaN.
+
+    Returns:
+    ndarray: Resampled values shaped (trials, points, columns).
+    """
+    times, values, lengths = _stack(trials, columns)
+    grids = np.asarray(grids, dtype=np.float64)
+    n_trials, n_points = grids.shape
+    # Index of the sample at or before each grid time, per trial
+    right = np.empty((n_trials, n_points), dtype=np.intp)
+    for i in range(n_trials):
+        right[i] = np.searchsorted(times[i, :lengths[i]], grids[i], side='right')
+    right = np.clip(right, 1, np.maximum(lengths - 1, 1)[:, None])
+    left = right - 1
+    rows = np.arange(n_trials)[:, None]
+    t0, t1 = times[rows, left], times[rows, right]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(t1 > t0, (grids - t0) / (t1 - t0), 0.0)
+    out = values[rows, left] + weight[..., None] * (values[rows, right] - values[rows, left])
+    outside = (grids < times[:, :1]) | (grids > times[rows[:, 0], lengths - 1][:, None])
+    out[outside] = np.nan
+    return out
+
+
+def cycle_grids(trials, n_points=CYCLE_POINTS, bounds=None):
+    """
+    Sample times of a 0-100% cycle grid in each trial.
+
+    Returns:
+    tuple: (cycle grid in percent, sample times shaped (trials, n_points))
+    """
+    cycle = np.linspace(0.0, 100.0, n_points)
+    if bounds is None:
+        bounds = [(df['time'].iloc[0], df['time'].iloc[-1]) for df in trials]
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 2)
+    return cycle, bounds[:, :1] + (bounds[:, 1:] - bounds[:, :1]) * cycle / 100.0
+
+
+def time_grids(trials, dt=None):
+    """
+    Sample times of a shared time base (seconds from each trial's start) in
+    each trial, long enough for the longest trial.
+
+    Returns:
+    tuple: (time grid, sample times shaped (trials, points))
+    """
+    starts = np.array([df['time'].iloc[0] for df in trials])
+    durations = np.array([df['time'].iloc[-1] for df in trials]) - starts
+    if dt is None:
+        steps = [np.median(np.diff(df['time'].to_numpy())) for df in trials if len(df) > 1]
+        dt = min(steps) if steps else None
+    if dt is None:
+        # Only single-frame trials: the time base is their one sample
+        grid = np.zeros(1)
+    else:
+        grid = np.arange(0.0, durations.max() + dt / 2, dt)
+    return grid, starts[:, None] + grid
+
+
+def normalize_to_cycle(trials, columns, n_points=CYCLE_POINTS, bounds=None):
+    """
+    Resample trials onto a common 0-100% cycle grid.
+
+    Parameters:
+    trials (list of DataFrame): Trials with a 'time' column.
+    columns (list of str): Columns to resample.
+    n_points (int): Grid points from 0% to 100%.
+    bounds (list of tuple): Optional (start, end) time of the cycle in each
+        trial, e.g. one repetition. Defaults to each trial's full duration.
+
+    Returns:
+    tuple: (cycle grid in percent, values shaped (trials, n_points, columns))
+    """
+    cycle, grids = cycle_grids(trials, n_points, bounds)
+    return cycle, resample(trials, columns, grids)
+
+
+def resample_to_time_base(trials, columns, dt=None):
+    """
+    Resample trials onto a shared time base starting at 0 s for every trial.
+
+    Parameters:
+    trials (list of DataFrame): Trials with a 'time' column.
+    columns (list of str): Columns to resample.
+    dt (float): Grid step. Defaults to the finest median step of the trials.
+
+    Returns:
+    tuple: (time grid, values shaped (trials, points, columns)). Trials
+    shorter than the longest one are NaN past their end.
+    """
+    grid, grids = time_grids(trials, dt)
+    return grid, resample(trials, columns, grids)
+
+
+def to_frame(grid, values, names, columns, grid_name='cycle'):
+    """
+    Tidy table of resampled values: one row per (trial, grid point).
+    """
+    n_trials, n_points, _ = values.shape
+    table = pd.DataFrame(values.reshape(n_trials * n_points, -1), columns=list(columns))
+    table.insert(0, grid_name, np.tile(grid, n_trials))
+    table.insert(0, 'trial', np.repeat(names, n_points))
+    return table
+
+
+class CycleCache:
+    """
+    Memoizes cycle-normalized trials so views can switch between raw time
+    and normalized cycle without recomputing.
+
+    Each entry holds every numeric column of one trial on the cycle grid,
+    keyed on (name, identity, n_points). Trials missing from the cache are
+    normalized together in one resample call.
+
+    Parameters:
+    loader (callable): name -> DataFrame with a 'time' column.
+    identity (callable): name -> hashable identity of the trial's contents.
+    maxsize (int): Number of trials kept.
+    """
+
+    def __init__(self, loader, identity, maxsize=256):
+        self.loader = loader
+        self.identity = identity
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names, n_points=CYCLE_POINTS):
+        """
+        Return {name: DataFrame with a 'cycle' column and every other column
+        resampled onto the 0-100% grid}.
+        """
+        keys = {name: (name, self.identity(name), n_points) for name in names}
+        result, missing = {}, []
+        with self._lock:
+            for name, key in keys.items():
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    result[name] = self._entries[key]
+                else:
+                    missing.append(name)
+        if missing:
+            frames = [self.loader(name) for name in missing]
+            # Trials with different column sets are normalized separately
+            groups = {}
+            for name, df in zip(missing, frames):
+                groups.setdefault(tuple(c for c in df.columns if c != 'time'), []).append((name, df))
+            for columns, members in groups.items():
+                cycle, values = normalize_to_cycle([df for _, df in members], list(columns), n_points)
+                for (name, _), block in zip(members, values):
+                    table = pd.DataFrame(block, columns=list(columns))
+                    table.insert(0, 'cycle', cycle)
+                    result[name] = table
+            with self._lock:
+                for name in missing:
+                    self._entries[keys[name]] = result[name]
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return result
+
+    def get(self, name, n_points=CYCLE_POINTS):
+        return self.get_many([name], n_points)[name]
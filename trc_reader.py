@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+
+# Header fields written by the capture software on lines 2-3 of a TRC file
+# and the type each one should be parsed as. Unknown fields are kept as strings.
+HEADER_TYPES = {
+    'DataRate': float,
+    'CameraRate': float,
+    'NumFrames': int,
+    'NumMarkers': int,
+    'Units': str,
+    'OrigDataRate': float,
+    'OrigDataStartFrame': int,
+    'OrigNumFrames': int,
+}
+
+# Number of header lines before the first row of marker data
+HEADER_LINES = 5
+
+# Rows parsed per chunk when streaming a trial into a memory-mapped array
+MMAP_CHUNK_ROWS = 4096
+
+
+@dataclass
+class TRCTrial:
+    """
+    A parsed TRC trial.
+
+    Attributes:
+    path (str): File the trial was read from.
+    data (ndarray): Marker positions shaped (frames, markers, 3).
+    time (ndarray): Time stamp of each frame in seconds.
+    frames (ndarray): Frame numbers from the Frame# column.
+    marker_names (tuple): Marker names in slot order.
+    marker_index (dict): Marker name -> slot in the marker axis of data.
+    header (dict): Header fields (DataRate, NumFrames, NumMarkers, Units, ...).
+    subject (str): Subject label when the trial is one person of a
+        multi-subject capture (see subjects()), else None.
+    """
+    path: str
+    data: np.ndarray
+    time: np.ndarray
+    frames: np.ndarray
+    marker_names: tuple
+    marker_index: dict = field(default_factory=dict)
+    header: dict = field(default_factory=dict)
+    subject: str = None
+
+    def __post_init__(self):
+        if not self.marker_index:
+            self.marker_index = build_marker_index(self.marker_names)
+
+    @property
+    def n_frames(self):
+        return self.data.shape[0]
+
+    @property
+    def n_markers(self):
+        return self.data.shape[1]
+
+    @property
+    def data_rate(self):
+        return self.header.get('DataRate')
+
+    @property
+    def units(self):
+        return self.header.get('Units')
+
+    def marker(self, name):
+        """
+        Return the (frames, 3) positions of a marker as a view into data.
+        """
+        return self.data[:, self.marker_index[name], :]
+
+    def subjects(self):
+        """
+        Split a multi-subject capture into one trial per person.
+
+        Each subject's data is a view into this trial's marker array (no
+        copy) whenever its markers sit at evenly spaced slots, which covers
+        both one block per person and interleaved marker sets. time and
+        frames are shared. A single-subject trial returns [self].
+
+        Returns:
+        list: One TRCTrial per subject, with the subject label set.
+        """
+        groups = detect_subjects(self.marker_names)
+        if len(groups) == 1:
+            return [self]
+        return [
+            TRCTrial(
+                path=self.path,
+                data=self.data[:, slots, :],
+                time=self.time,
+                frames=self.frames,
+                marker_names=names,
+                header={**self.header, 'NumMarkers': len(names)},
+                subject=label,
+            )
+            for label, slots, names in groups
+        ]
+
+    def to_dataframe(self):
+        """
+        Build the MultiIndex DataFrame that read_in_files + clip_and_clean
+        produce, so existing consumers can be fed from a TRCTrial.
+        """
+        marker_level = ['Frame#', 'Time']
+        coord_level = ['Unnamed: 0_level_1', 'Unnamed: 1_level_1']
+        for slot, name in enumerate(self.marker_names, start=1):
+            marker_level.extend([name, name, name])
+            coord_level.extend([f"X{slot}", f"Y{slot}", f"Z{slot}"])
+        values = np.column_stack([
+            self.frames,
+            self.time,
+            self.data.reshape(self.n_frames, -1),
+        ])
+        df = pd.DataFrame(values, columns=pd.MultiIndex.from_arrays([marker_level, coord_level]))
+        df['Frame#'] = df['Frame#'].astype(int)
+        return df
+
+
+def build_marker_index(marker_names):
+    """
+    Map each marker name to its slot. If a name repeats, the first slot wins.
+    """
+    index = {}
+    for slot, name in enumerate(marker_names):
+        index.setdefault(name, slot)
+    return index
+
+
+def detect_subjects(marker_names):
+    """
+    Find the marker set of each person in a capture.
+
+    Markers named 'Subject:marker' (Vicon style) are grouped by prefix.
+    Otherwise a marker name that repeats marks a repeated marker set: the
+    k-th occurrence of every name belongs to subject k.
+
+    Parameters:
+    marker_names (tuple): Marker names in slot order.
+
+    Returns:
+    list: (label, slots, names) per subject. slots is a slice when the
+    subject's markers are evenly spaced (so indexing data with it gives a
+    view) and an index array otherwise; names are the subject's marker
+    names without any prefix.
+    """
+    slots_of, names_of = {}, {}
+    if marker_names and all(':' in name for name in marker_names):
+        for slot, name in enumerate(marker_names):
+            label, marker = name.split(':', 1)
+            slots_of.setdefault(label, []).append(slot)
+            names_of.setdefault(label, []).append(marker)
+    else:
+        seen = {}
+        for slot, name in enumerate(marker_names):
+            occurrence = seen[name] = seen.get(name, 0) + 1
+            label = f"subject_{occurrence}"
+            slots_of.setdefault(label, []).append(slot)
+            names_of.setdefault(label, []).append(name)
+    return [(label, _as_slice(slots), tuple(names_of[label])) for label, slots in slots_of.items()]
+
+
+def _as_slice(slots):
+    """
+    Express evenly spaced slots as a slice, else return them as an array.
+    """
+    slots = np.asarray(slots, dtype=np.intp)
+    if len(slots) == 1:
+        return slice(int(slots[0]), int(slots[0]) + 1)
+    steps = np.diff(slots)
+    if steps[0] > 0 and np.all(steps == steps[0]):
+        return slice(int(slots[0]), int(slots[-1]) + 1, int(steps[0]))
+    return slots
+
+
+def _split_line(line):
+    return line.rstrip('\r\n').split('\t')
+
+
+def read_trc_header(path):
+    """
+    Read the header block of a TRC file.
+
+    Parameters:
+    path (str): Path to the TRC file.
+
+    Returns:
+    tuple: (header dict, tuple of marker names)
+    """
+    with open(path) as f:
+        lines = [f.readline() for _ in range(HEADER_LINES)]
+    return parse_trc_header(lines)
+
+
+def parse_trc_header(lines):
+    """
+    Parse the first HEADER_LINES lines of a TRC file.
+
+    Returns:
+    tuple: (header dict, tuple of marker names)
+    """
+    keys = _split_line(lines[1])
+    values = _split_line(lines[2])
+    header = {}
+    for key, value in zip(keys, values):
+        key = key.strip()
+        if not key:
+            continue
+        cast = HEADER_TYPES.get(key, str)
+        try:
+            header[key] = cast(float(value)) if cast is int else cast(value)
+        except ValueError:
+            header[key] = value.strip()
+
+    # Marker names sit on line 4 after Frame# and Time, separated by empty cells
+    marker_names = tuple(name.strip() for name in _split_line(lines[3])[2:] if name.strip())
+    return header, marker_names
+
+
+def read_trc(path, dtype=np.float64, mmap_path=None):
+    """
+    Read a TRC file into a TRCTrial.
+
+    The header is parsed once and the numeric block is read with the pandas C
+    parser straight into a (frames, markers, 3) array.
+
+    Parameters:
+    path (str): Path to the TRC file.
+    dtype: Float dtype of the marker array (np.float32 or np.float64).
+    mmap_path (str): Optional .npy path. When given, the numeric block is
+        streamed into a memory-mapped file in chunks of MMAP_CHUNK_ROWS rows
+        and the trial's data is a read-only memmap of it, so very long
+        recordings never have to fit in memory at once.
+
+    Returns:
+    TRCTrial: The parsed trial.
+    """
+    header, marker_names = read_trc_header(path)
+    n_markers = len(marker_names)
+    n_columns = 2 + 3 * n_markers
+    read_kwargs = dict(
+        sep='\t',
+        header=None,
+        skiprows=HEADER_LINES,
+        usecols=range(n_columns),
+        dtype=np.float64,
+        engine='c',
+    )
+
+    if mmap_path is None:
+        block = pd.read_csv(path, **read_kwargs).to_numpy()
+        frames = block[:, 0].astype(np.int64)
+        time = block[:, 1].copy()
+        data = np.ascontiguousarray(block[:, 2:], dtype=dtype).reshape(-1, n_markers, 3)
+    else:
+        frames, time, data = _read_trc_to_memmap(path, read_kwargs, n_markers, dtype, mmap_path)
+
+    return TRCTrial(
+        path=str(path),
+        data=data,
+        time=time,
+        frames=frames,
+        marker_names=marker_names,
+        header=header,
+    )
+
+
+def _count_data_rows(path):
+    """
+    Upper bound on the number of data rows, counted without parsing them.
+    """
+    with open(path, 'rb') as f:
+        n_lines = 0
+        last = b''
+        for block in iter(lambda: f.read(1 << 20), b''):
+            n_lines += block.count(b'\n')
+            last = block
+    if last and not last.endswith(b'\n'):
+        n_lines += 1
+    return max(n_lines - HEADER_LINES, 0)
+
+
+def _read_trc_to_memmap(path, read_kwargs, n_markers, dtype, mmap_path):
+    """
+    Stream the numeric block of a TRC file into a .npy memmap chunk by chunk.
+    """
+    capacity = _count_data_rows(path)
+    out = np.lib.format.open_memmap(mmap_path, mode='w+', dtype=dtype, shape=(capacity, n_markers, 3))
+    frames, times = [], []
+    n_rows = 0
+    for chunk in pd.read_csv(path, chunksize=MMAP_CHUNK_ROWS, **read_kwargs):
+        block = chunk.to_numpy()
+        rows = block.shape[0]
+        out[n_rows:n_rows + rows] = block[:, 2:].reshape(rows, n_markers, 3)
+        frames.append(block[:, 0].astype(np.int64))
+        times.append(block[:, 1])
+        n_rows += rows
+    out.flush()
+    del out
+
+    data = np.load(mmap_path, mmap_mode='r')[:n_rows]
+    frames = np.concatenate(frames) if frames else np.empty(0, dtype=np.int64)
+    time = np.concatenate(times) if times else np.empty(0)
+    return frames, time, data
+
+
+def read_trc_files(file_paths, dtype=np.float64):
+    """
+    Read a list of TRC files into TRCTrials.
+
+    Parameters:
+    file_paths (list): List of file paths to read.
+    dtype: Float dtype of the marker arrays.
+
+    Returns:
+    list: List of TRCTrial.
+    """
+    return [read_trc(path, dtype=dtype) for path in file_paths]
@@ -0,0 +1,335 @@
+import io
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from angle_engine import angle_slots, apply_supplement, batch_angles, validate_angles
+from trc_reader import HEADER_LINES, build_marker_index, parse_trc_header
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of the most recent rows of an array stream.
+
+    Memory stays at capacity rows no matter how long the stream runs; rows are
+    also addressable by their absolute position in the stream, so readers can
+    ask for everything appended since the last row they saw.
+
+    Parameters:
+    capacity (int): Rows kept.
+    row_shape (tuple): Shape of one row, e.g. () for scalars or (n_angles,).
+    dtype: Array dtype.
+    """
+
+    def __init__(self, capacity, row_shape=(), dtype=np.float64):
+        self.capacity = capacity
+        self._data = np.full((capacity, *row_shape), np.nan, dtype=dtype)
+        self.total = 0  # rows ever appended
+        self._start = 0  # absolute position of the first row since the last clear()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total - self._start, self.capacity)
+
+    def clear(self):
+        """
+        Drop every row. Positions keep counting, so readers' positions stay valid.
+        """
+        with self._lock:
+            self._start = self.total
+
+    def append(self, rows):
+        """
+        Append a block of rows shaped (n, *row_shape).
+        """
+        rows = np.asarray(rows)
+        n = len(rows)
+        if n == 0:
+            return
+        with self._lock:
+            if n >= self.capacity:
+                rows = rows[-self.capacity:]
+                self.total += n - self.capacity
+                n = self.capacity
+            start = self.total % self.capacity
+            first = min(n, self.capacity - start)
+            self._data[start:start + first] = rows[:first]
+            self._data[:n - first] = rows[first:]
+            self.total += n
+
+    def since(self, position):
+        """
+        Rows appended after absolute position `position`, oldest first. Rows
+        that have already been overwritten are skipped.
+
+        Returns:
+        tuple: (rows, new position)
+        """
+        with self._lock:
+            position = max(position, self.total - len(self))
+            n = self.total - position
+            idx = (position + np.arange(n)) % self.capacity
+            return self._data[idx].copy(), self.total
+
+    def latest(self, n=None):
+        rows, _ = self.since(self.total - (len(self) if n is None else min(n, len(self))))
+        return rows
+
+
+class TRCStreamParser:
+    """
+    Incremental TRC parser: feed it text as it arrives and it returns the
+    complete frames parsed so far.
+
+    The first HEADER_LINES lines are the TRC header; every later complete line
+    is a frame. Partial lines are kept until the rest arrives.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.marker_names = None
+        self.marker_index = None
+        self._pending = ''
+        self._header_lines = []
+
+    @property
+    def ready(self):
+        return self.marker_names is not None
+
+    def _parse_header(self):
+        self.header, self.marker_names = parse_trc_header(self._header_lines)
+        self.marker_index = build_marker_index(self.marker_names)
+
+    def feed(self, text):
+        """
+        Consume a chunk of text.
+
+        Returns:
+        tuple: (time, data) of the new complete frames, shaped (n,) and
+        (n, markers, 3); both empty when no frame was completed.
+        """
+        self._pending += text
+        lines = self._pending.split('\n')
+        self._pending = lines.pop()
+        while lines and not self.ready:
+            self._header_lines.append(lines.pop(0))
+            if len(self._header_lines) == HEADER_LINES:
+                self._parse_header()
+        lines = [line for line in lines if line.strip()]
+        if not self.ready or not lines:
+            n_markers = len(self.marker_names) if self.ready else 0
+            return np.empty(0), np.empty((0, n_markers, 3))
+        n_columns = 2 + 3 * len(self.marker_names)
+        block = pd.read_csv(io.StringIO('\n'.join(lines)), sep='\t', header=None,
+                            usecols=range(n_columns), dtype=np.float64, engine='c').to_numpy()
+        return block[:, 1], block[:, 2:].reshape(len(block), -1, 3)
+
+
+class TRCTail:
+    """
+    Follows a TRC file that is still being written, like `tail -f`. When the
+    file is truncated or replaced (a new recording), reading restarts from its
+    header with a new parser and `session` is incremented.
+
+    Parameters:
+    path (str): File to follow.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parser = TRCStreamParser()
+        self._offset = 0
+        self._inode = None
+        self.session = 0
+
+    def poll(self):
+        """
+        Read whatever was appended since the last poll.
+
+        Returns:
+        tuple: (time, data) of the new complete frames.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size < self._offset or self._inode not in (None, stat.st_ino):
+                    self._offset = 0
+                    self.parser = TRCStreamParser()
+                    self.session += 1
+                self._inode = stat.st_ino
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            chunk = b''
+        self._offset += len(chunk)
+        return self.parser.feed(chunk.decode('utf-8', errors='replace'))
+
+
+class SocketFrameSource:
+    """
+    Accepts TRC text (header then frame lines) from a client on a local TCP
+    socket, e.g. a capture tool writing the same lines it would write to a file.
+    Each connection is a new recording: it starts with its own header, so the
+    parser is replaced and `session` incremented on every accept.
+
+    Parameters:
+    host (str): Interface to listen on (local only by default).
+    port (int): Port to listen on; 0 picks a free one (see .port).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.parser = TRCStreamParser()
+        self._server = socket.create_server((host, port))
+        self._server.setblocking(False)
+        self.port = self._server.getsockname()[1]
+        self._conn = None
+        self.session = 0
+
+    def poll(self):
+        """
+        Read whatever the connected client has sent since the last poll.
+
+        Returns:
+        tuple: (time, data) of the new complete frames.
+        """
+        if self._conn is None:
+            try:
+                self._conn, _ = self._server.accept()
+                self._conn.setblocking(False)
+            except BlockingIOError:
+                return self.parser.feed('')
+            self.parser = TRCStreamParser()
+            self.session += 1
+        chunks = []
+        while True:
+            try:
+                chunk = self._conn.recv(1 << 16)
+            except BlockingIOError:
+                break
+            if not chunk:
+                # Client closed; wait for the next one
+                self._conn.close()
+                self._conn = None
+                break
+            chunks.append(chunk)
+        return self.parser.feed(b''.join(chunks).decode('utf-8', errors='replace'))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._server.close()
+
+
+class LiveAngles:
+    """
+    Pushes frames from a TRCTail or SocketFrameSource through angle
+    definitions incrementally, keeping the last `capacity` frames of time and
+    angles in ring buffers. When the source starts a new session (a socket
+    client reconnected), the buffers are cleared and the angle definitions
+    re-validated against the new header.
+
+    Parameters:
+    source: TRCTail or SocketFrameSource.
+    angle_types (list of str): Keys of angle_engine.ANGLE_REGISTRY.
+    capacity (int): Frames kept in memory.
+    """
+
+    def __init__(self, source, angle_types, capacity=10000):
+        self.source = source
+        self.angle_types = list(angle_types)
+        self.time = RingBuffer(capacity)
+        self.angles = RingBuffer(capacity, (len(self.angle_types),))
+        self._slots = None
+        self.session = getattr(source, 'session', 0)
+        # Session whose marker set the angle definitions were rejected for
+        self._rejected = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def update(self):
+        """
+        Poll the source once and compute angles for the new frames only.
+
+        Returns:
+        int: Number of new frames.
+        """
+        time_block, data = self.source.poll()
+        session = getattr(self.source, 'session', 0)
+        if session != self.session:
+            # New recording with its own header and marker set
+            with self._lock:
+                self.time.clear()
+                self.angles.clear()
+                self.session = session
+            self._slots = None
+            self._rejected = None
+        if len(time_block) == 0 or self._rejected == self.session:
+            # Frames of a recording the angles cannot be computed for are dropped
+            return 0
+        if self._slots is None:
+            # Validate the definitions once, against the streamed marker set;
+            # a rejection holds until the next session brings a new header
+            try:
+                definitions = validate_angles(self.angle_types, self.source.parser.marker_index)
+            except ValueError:
+                self._rejected = self.session
+                raise
+            self._slots = angle_slots(self.source.parser.marker_index, definitions)
+        p, v, d, supplement = self._slots
+        angles = apply_supplement(batch_angles(data[:, p, :], data[:, v, :], data[:, d, :]), supplement)
+        with self._lock:
+            self.angles.append(angles)
+            self.time.append(time_block)
+        return len(time_block)
+
+    def since(self, position):
+        """
+        Time and angles appended after absolute frame `position`.
+
+        Returns:
+        tuple: (time, angles, new position, session)
+        """
+        with self._lock:
+            times, new_position = self.time.since(position)
+            angles, _ = self.angles.since(position)
+            session = self.session
+        return times, angles, new_position, session
+
+    def start(self, interval=0.05):
+        """
+        Poll the source on a background thread every `interval` seconds; does
+        nothing if the thread is already running. Errors (e.g. a malformed
+        frame) are reported once per distinct message and polling continues,
+        backing off while they repeat.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='live-angles', daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        last_error, failures = None, 0
+        while not self._stop.is_set():
+            try:
+                self.update()
+                last_error, failures = None, 0
+            except Exception as exc:  # keep the live plot alive
+                message = f"{type(exc).__name__}: {exc}"
+                if message != last_error:
+                    print(f"Warning: live update failed: {message}", file=sys.stderr)
+                last_error, failures = message, failures + 1
+            # Up to 64x the interval while the same error keeps recurring
+            self._stop.wait(interval * 2 ** min(failures, 6))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers rely on the rename order alone
+    fcntl = None
+
+# --- CONFIGURATION ---
+# Parsed trials are stored as one directory per source file under CACHE_DIR:
+# each numeric block is a .npy file (loaded memory-mapped, so repeat loads are
+# near zero-copy) and meta.json holds the header fields and the source file's
+# path, size, mtime and content hash used to detect stale entries.
+CACHE_DIR = os.environ.get("TRIAL_CACHE_DIR", ".trial_cache")
+# Total size cap of the cache; least recently used entries are evicted past it
+CACHE_MAX_BYTES = int(os.environ.get("TRIAL_CACHE_MAX_BYTES", 1 << 30))
+# Bumped whenever the stored layout changes so old entries are re-parsed
+CACHE_VERSION = 1
+
+
+def file_digest(path):
+    """
+    Content hash of a file (BLAKE2b, read in 1 MB blocks).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry_dir(path, kind, cache_dir):
+    key = hashlib.sha1(f"{kind}:{os.path.abspath(path)}".encode()).hexdigest()
+    return os.path.join(cache_dir, f"{kind}-{key}")
+
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _lookup(path, kind, cache_dir, variant):
+    """
+    Return (entry dir, meta) for an up-to-date cache entry, or (entry dir, None).
+
+    An entry is fresh when the source's size and mtime match. If they do not
+    but the content hash still does (e.g. the file was touched or copied), the
+    stored stat is refreshed and the entry is reused.
+    """
+    entry = _entry_dir(path, kind, cache_dir)
+    meta = _read_meta(entry)
+    if meta is None or meta.get('version') != CACHE_VERSION or meta.get('variant') != variant:
+        return entry, None
+    stat = os.stat(path)
+    if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return entry, meta
+    if meta['size'] == stat.st_size and meta['digest'] == file_digest(path):
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_meta(entry, meta)
+        return entry, meta
+    return entry, None
+
+
+def _write_meta(entry, meta):
+    tmp = os.path.join(entry, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(entry, 'meta.json'))
+
+
+def _touch(entry):
+    # Entry directory mtime doubles as the last-access time for LRU eviction
+    now = time.time()
+    os.utime(entry, (now, now))
+
+
+def _store(path, kind, cache_dir, variant, arrays, fields):
+    """
+    Write arrays and metadata for a source file into a fresh cache entry.
+
+    Writers of the same entry are serialized with a lock file; a writer that
+    finds the entry already refreshed by another process keeps that one.
+    """
+    entry = _entry_dir(path, kind, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f"{entry}.lock", 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        _, meta = _lookup(path, kind, cache_dir, variant)
+        if meta is None:
+            meta = _swap_entry(path, kind, entry, variant, arrays, fields)
+        _touch(entry)
+    evict(cache_dir, keep=entry)
+    return entry, meta
+
+
+def _swap_entry(path, kind, entry, variant, arrays, fields):
+    tmp_entry = f"{entry}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_entry, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    stat = os.stat(path)
+    meta = {
+        'version': CACHE_VERSION,
+        'variant': variant,
+        'kind': kind,
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'digest': file_digest(path),
+        **fields,
+    }
+    _write_meta(tmp_entry, meta)
+    # Move the old entry aside before renaming the new one into place, so
+    # readers never see a half-deleted entry
+    old_entry = f"{entry}.old{os.getpid()}"
+    shutil.rmtree(old_entry, ignore_errors=True)
+    try:
+        os.replace(entry, old_entry)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp_entry, entry)
+    except OSError:
+        # Another writer (without the lock) installed an entry between the
+        # two renames; it was parsed from the same file, so keep theirs
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        meta = _read_meta(entry) or meta
+    shutil.rmtree(old_entry, ignore_errors=True)
+    return meta
+
+
+def _load_array(entry, name):
+    return np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r')
+
+
+def _entry_bytes(entry):
+    total = 0
+    for e in os.scandir(entry):
+        total += _entry_bytes(e.path) if e.is_dir() else e.stat().st_size
+    return total
+
+
+def evict(cache_dir=None, max_bytes=None, keep=None):
+    """
+    Remove least recently used entries until the cache fits in max_bytes.
+
+    Parameters:
+    cache_dir (str): Cache directory. Defaults to CACHE_DIR.
+    max_bytes (int): Size cap. Defaults to CACHE_MAX_BYTES.
+    keep (str): Entry directory never removed (the one about to be read),
+        even if it alone exceeds max_bytes.
+
+    Returns:
+    int: Number of entries removed.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = os.path.abspath(keep) if keep else None
+    entries = []
+    for e in os.scandir(cache_dir):
+        if e.is_dir() and '.tmp' not in e.name and '.old' not in e.name:
+            entries.append((e.stat().st_mtime, _entry_bytes(e.path), e.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(entry) == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear(cache_dir=None):
+    """
+    Remove every cache entry.
+    """
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
+
+
+def load_trc(path, dtype=np.float64, cache_dir=None):
+    """
+    Load a TRC trial through the cache, parsing it only when the cache entry
+    is missing or stale.
+
+    Parameters:
+    path (str): Path to the TRC file.
+    dtype: Float dtype of the marker array.
+    cache_dir (str): Cache directory. Defaults to CACHE_DIR.
+
+    Returns:
+    TRCTrial: The trial, with memory-mapped read-only arrays.
+    """
+    from trc_reader import TRCTrial, read_trc
+
+    cache_dir = cache_dir or CACHE_DIR
+    variant = np.dtype(dtype).name
+    entry, meta = _lookup(path, 'trc', cache_dir, variant)
+    if meta is None:
+        trial = read_trc(path, dtype=dtype)
+        entry, meta = _store(path, 'trc', cache_dir, variant,
+                             {'data': trial.data, 'time': trial.time, 'frames': trial.frames},
+                             {'header': trial.header, 'marker_names': list(trial.marker_names)})
+    else:
+        _touch(entry)
+    return TRCTrial(
+        path=str(path),
+        data=_load_array(entry, 'data'),
+        time=_load_array(entry, 'time'),
+        frames=_load_array(entry, 'frames'),
+        marker_names=tuple(meta['marker_names']),
+        header=meta['header'],
+    )
+
+
+def load_sto(path, cache_dir=None):
+    """
+    Load a sto file through the cache, parsing it only when the cache entry
+    is missing or stale.
+
+    Parameters:
+    path (str): Path to the sto file.
+    cache_dir (str): Cache directory. Defaults to CACHE_DIR.
+
+    Returns:
+    tuple: (DataFrame backed by the memory-mapped block, header dict), the
+    same as sto_processing.read_sto.
+    """
+    from sto_processing import read_sto
+
+    cache_dir = cache_dir or CACHE_DIR
+    entry, meta = _lookup(path, 'sto', cache_dir, 'float64')
+    if meta is None:
+        data, header = read_sto(path)
+        entry, meta = _store(path, 'sto', cache_dir, 'float64',
+                             {'values': data.to_numpy(dtype=np.float64)},
+                             {'header': header, 'columns': list(data.columns)})
+    else:
+        _touch(entry)
+    data = pd.DataFrame(_load_array(entry, 'values'), columns=meta['columns'], copy=False)
+    return data, meta['header']
+
+
+def load_derived(path, name, params, compute, cache_dir=None):
+    """
+    Load arrays derived from a trial (segment index, filtered markers, ...)
+    from the trial's cache entry, computing and storing them on first use.
+
+    Derived arrays live inside the source file's entry, so they are dropped
+    with it when the source changes or the entry is evicted.
+
+    Parameters:
+    path (str): STO or TRC file the arrays are derived from.
+    name (str): Name of the derived data.
+    params: JSON-serializable settings the result depends on.
+    compute (callable): () -> dict of name -> ndarray.
+    cache_dir (str): Cache directory. Defaults to CACHE_DIR.
+
+    Returns:
+    dict: name -> memory-mapped ndarray.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    kind = 'trc' if str(path).lower().endswith('.trc') else 'sto'
+    # Make sure the entry exists and is fresh before looking inside it
+    (load_trc if kind == 'trc' else load_sto)(path, cache_dir=cache_dir)
+    entry = _entry_dir(path, kind, cache_dir)
+    tag = hashlib.sha1(json.dumps([name, params], sort_keys=True, default=str).encode()).hexdigest()[:16]
+    derived = os.path.join(entry, f"derived-{name}-{tag}")
+    if not os.path.isdir(derived):
+        arrays = compute()
+        tmp = f"{derived}.tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        try:
+            os.replace(tmp, derived)
+        except OSError:
+            # Another process stored it first
+            shutil.rmtree(tmp, ignore_errors=True)
+        evict(cache_dir, keep=entry)
+    return {os.path.splitext(e.name)[0]: np.load(e.path, mmap_mode='r')
+            for e in os.scandir(derived) if e.name.endswith('.npy')}
@@ -0,0 +1,276 @@
+"""
+SQLite catalog of every trial with per-metric summary statistics.
+
+Each STO/TRC file gets one row of metadata (parsed from names like
+0627G1squat: date, subject, trial number, movement) and header fields, plus
+min/max/mean/range of motion/peak time of every metric (STO coordinates, or
+the default joint angles for TRC files). Files are re-summarized only when
+their size or mtime changes, so trials can be filtered without loading them.
+
+Example:
+    python trial_catalog.py STOfiles TRCfiles
+    python trial_catalog.py STOfiles --movement squat --metric knee_angle_r --stat rom --min 100
+"""
+import argparse
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+# --- CONFIGURATION ---
+CATALOG_PATH = os.environ.get("TRIAL_CATALOG", "trial_catalog.sqlite")
+# Summary statistics stored per (trial, metric)
+STATS = ('min', 'max', 'mean', 'rom', 'peak_time')
+# Angles summarized for TRC trials
+TRC_ANGLES = ['shoulder', 'elbow', 'wrist', 'hip', 'knee_r', 'ankle', 'knee_l']
+
+# 0627G1squat -> date 0627 (MMDD), subject G, trial 1, movement squat
+NAME_PATTERN = re.compile(r'^(?P<date>\d{4})(?P<subject>[A-Za-z]+?)(?P<trial>\d+)(?P<movement>[A-Za-z]+)')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    date TEXT,
+    subject TEXT,
+    trial INTEGER,
+    movement TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    n_rows INTEGER,
+    in_degrees INTEGER,
+    data_rate REAL,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    path TEXT NOT NULL REFERENCES trials(path) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    min REAL,
+    max REAL,
+    mean REAL,
+    rom REAL,
+    peak_time REAL,
+    PRIMARY KEY (path, metric)
+);
+CREATE INDEX IF NOT EXISTS metrics_metric ON metrics (metric);
+"""
+
+
+def connect(db_path=None):
+    """
+    Open the catalog, creating its tables if needed.
+    """
+    conn = sqlite3.connect(db_path or CATALOG_PATH)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def parse_trial_name(path):
+    """
+    Metadata encoded in a trial's file name.
+
+    Returns:
+    dict: date (MMDD), subject, trial and movement, all None if the name does
+    not follow the <MMDD><subject><trial><movement> pattern.
+    """
+    match = NAME_PATTERN.match(os.path.basename(path))
+    if match is None:
+        return {'date': None, 'subject': None, 'trial': None, 'movement': None}
+    return {
+        'date': match['date'],
+        'subject': match['subject'],
+        'trial': int(match['trial']),
+        'movement': match['movement'].lower(),
+    }
+
+
+def summarize(time, values):
+    """
+    Summary statistics of every column of values (samples, metrics).
+
+    Returns:
+    ndarray: (metrics, len(STATS)) rows of min, max, mean, rom, peak_time.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[0] == 0:
+        return np.full((values.shape[1], len(STATS)), np.nan)
+    with np.errstate(all='ignore'):
+        low = np.nanmin(values, axis=0)
+        high = np.nanmax(values, axis=0)
+        mean = np.nanmean(values, axis=0)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    peak_time = np.asarray(time, dtype=np.float64)[np.argmax(filled, axis=0)]
+    return np.column_stack([low, high, mean, high - low, peak_time])
+
+
+def _summarize_sto(path):
+    from trial_cache import load_sto
+
+    df, header = load_sto(path)
+    columns = [c for c in df.columns if c != 'time']
+    time = df['time'].to_numpy()
+    fields = {
+        'n_rows': len(df),
+        'in_degrees': int(str(header.get('inDegrees', '')).lower() == 'yes'),
+        'data_rate': float(1.0 / np.median(np.diff(time))) if len(time) > 1 else None,
+        'duration': float(time[-1] - time[0]) if len(time) else None,
+    }
+    return fields, columns, summarize(time, df[columns].to_numpy())
+
+
+def _summarize_trc(path):
+    from angle_engine import ANGLE_REGISTRY, compute_angles
+    from trial_cache import load_trc
+
+    trial = load_trc(path)
+    angles = [t for t in TRC_ANGLES if all(m in trial.marker_index for m in ANGLE_REGISTRY[t].markers)]
+    table = compute_angles(trial, angles)
+    columns = [f'{t}_angle' for t in angles]
+    fields = {
+        'n_rows': trial.n_frames,
+        'in_degrees': 1,
+        'data_rate': trial.data_rate,
+        'duration': float(trial.time[-1] - trial.time[0]) if trial.n_frames else None,
+    }
+    return fields, columns, summarize(trial.time, table[columns].to_numpy())
+
+
+def find_files(inputs):
+    """
+    .sto and .trc files under the given directories (recursively) and files.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                paths.extend(os.path.join(root, n) for n in names if n.lower().endswith(('.sto', '.trc')))
+        elif item.lower().endswith(('.sto', '.trc')):
+            paths.append(item)
+    return sorted(os.path.abspath(p) for p in paths)
+
+
+def update_catalog(inputs, db_path=None):
+    """
+    Bring the catalog up to date with the trials under `inputs`.
+
+    Only new files and files whose size or mtime changed are loaded and
+    summarized; catalogued files under the given directories that no longer
+    exist are removed. Files that cannot be read are reported and skipped
+    (their previous row, if any, is kept until they read cleanly).
+
+    Parameters:
+    inputs (list): Directories and/or files.
+    db_path (str): Catalog file. Defaults to CATALOG_PATH.
+
+    Returns:
+    tuple: (paths added or updated, paths removed)
+    """
+    paths = find_files(inputs)
+    roots = [os.path.abspath(item) + os.sep for item in inputs if os.path.isdir(item)]
+    updated = []
+    with closing(connect(db_path)) as conn, conn:
+        known = {path: (size, mtime) for path, size, mtime in conn.execute("SELECT path, size, mtime_ns FROM trials")}
+        for path in paths:
+            kind = 'trc' if path.lower().endswith('.trc') else 'sto'
+            try:
+                stat = os.stat(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                fields, columns, stats = (_summarize_trc if kind == 'trc' else _summarize_sto)(path)
+            except Exception as exc:  # one unreadable file must not roll back the others
+                print(f"Warning: skipping {path}: {type(exc).__name__}: {exc}")
+                continue
+            row = {'path': path, 'kind': kind, 'name': os.path.basename(path), **parse_trial_name(path),
+                   'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **fields}
+            conn.execute("DELETE FROM trials WHERE path = ?", (path,))
+            conn.execute(f"INSERT INTO trials ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                         list(row.values()))
+            conn.executemany(
+                f"INSERT INTO metrics (path, metric, {', '.join(STATS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(path, metric, *[None if np.isnan(v) else float(v) for v in values])
+                 for metric, values in zip(columns, stats)],
+            )
+            updated.append(path)
+        present = set(paths)
+        removed = [path for path in known if path not in present and any(path.startswith(r) for r in roots)]
+        conn.executemany("DELETE FROM trials WHERE path = ?", [(path,) for path in removed])
+    return updated, removed
+
+
+def query_trials(db_path=None, kind=None, movement=None, subject=None, metric=None, stat='rom',
+                 minimum=None, maximum=None):
+    """
+    Paths of catalogued trials matching every given filter.
+
+    Parameters:
+    kind (str): 'sto' or 'trc'.
+    movement, subject (str or list): Allowed values.
+    metric (str): Metric the stat bounds apply to, e.g. 'knee_angle_r'.
+    stat (str): One of STATS.
+    minimum, maximum (float): Bounds on the metric's stat.
+
+    Returns:
+    list: Matching paths, sorted.
+    """
+    if stat not in STATS:
+        raise ValueError(f"Invalid stat: {stat}")
+    clauses, args = [], []
+    for column, value in (('t.kind', kind), ('t.movement', movement), ('t.subject', subject)):
+        if value:
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+    join = ""
+    if metric:
+        join = "JOIN metrics m ON m.path = t.path AND m.metric = ?"
+        args.insert(0, metric)
+        if minimum is not None:
+            clauses.append(f"m.{stat} >= ?")
+            args.append(minimum)
+        if maximum is not None:
+            clauses.append(f"m.{stat} <= ?")
+            args.append(maximum)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute(f"SELECT t.path FROM trials t {join} {where} ORDER BY t.path", args)
+        return [path for (path,) in rows]
+
+
+def distinct_values(column, db_path=None, kind=None):
+    """
+    Sorted non-null values of a trials column ('movement', 'subject', ...).
+    """
+    if column not in ('kind', 'date', 'subject', 'trial', 'movement'):
+        raise ValueError(f"Invalid column: {column}")
+    where, args = ("WHERE kind = ?", [kind]) if kind else ("", [])
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute(f"SELECT DISTINCT {column} FROM trials {where} ORDER BY {column}", args)
+        return [value for (value,) in rows if value is not None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Update and query the trial catalog.')
+    parser.add_argument('inputs', nargs='*', default=['STOfiles', 'TRCfiles'], help='directories or files')
+    parser.add_argument('--db', default=CATALOG_PATH, help='catalog file')
+    parser.add_argument('--kind', choices=['sto', 'trc'])
+    parser.add_argument('--movement', nargs='+')
+    parser.add_argument('--subject', nargs='+')
+    parser.add_argument('--metric')
+    parser.add_argument('--stat', default='rom', choices=STATS)
+    parser.add_argument('--min', type=float, dest='minimum')
+    parser.add_argument('--max', type=float, dest='maximum')
+    args = parser.parse_args(argv)
+
+    updated, removed = update_catalog(args.inputs, args.db)
+    print(f"{len(updated)} trials added or updated, {len(removed)} removed")
+    for path in query_trials(args.db, args.kind, args.movement, args.subject, args.metric, args.stat,
+                             args.minimum, args.maximum):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized between processes
+    fcntl = None
+
+# Bumped whenever the library layout changes so old libraries are rebuilt
+LIBRARY_VERSION = 1
+
+
+def frame_nbytes(df):
+    """
+    Bytes held by a DataFrame's columns (what the store charges a trial).
+    """
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class TrialStore:
+    """
+    Loads trials on first use and keeps them in an LRU cache bounded by bytes.
+
+    Parameters:
+    loader (callable): name -> trial, e.g. a function reading one sto file.
+    max_bytes (int): Memory budget; least recently used trials are dropped past it.
+    sizeof (callable): trial -> bytes. Defaults to frame_nbytes.
+    workers (int): Threads used by prefetch.
+    """
+
+    def __init__(self, loader, max_bytes, sizeof=frame_nbytes, workers=2):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._trials = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='trial-prefetch')
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def __contains__(self, name):
+        return name in self._trials
+
+    def get(self, name):
+        """
+        Return a trial, loading it if it is not cached.
+        """
+        with self._lock:
+            if name in self._trials:
+                self._trials.move_to_end(name)
+                return self._trials[name]
+            # Share one load between threads asking for the same trial
+            event = self._loading.get(name)
+            owner = event is None
+            if owner:
+                event = self._loading[name] = threading.Event()
+        if not owner:
+            event.wait()
+            with self._lock:
+                if name in self._trials:
+                    self._trials.move_to_end(name)
+                    return self._trials[name]
+            return self.get(name)
+        try:
+            trial = self.loader(name)
+            self._put(name, trial)
+            return trial
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+            event.set()
+
+    def _put(self, name, trial):
+        size = self.sizeof(trial)
+        with self._lock:
+            self._trials[name] = trial
+            self._sizes[name] = size
+            self._trials.move_to_end(name)
+            # Evict oldest first, but always keep the trial just loaded
+            while self.nbytes > self.max_bytes and len(self._trials) > 1:
+                old, _ = self._trials.popitem(last=False)
+                del self._sizes[old]
+
+    def prefetch(self, names):
+        """
+        Load trials in the background. Returns the list of futures.
+        """
+        return [self._executor.submit(self.get, name) for name in names if name not in self._trials]
+
+    def evict(self, name):
+        with self._lock:
+            if self._trials.pop(name, None) is not None:
+                del self._sizes[name]
+
+    def stats(self):
+        with self._lock:
+            per_trial = dict(self._sizes)
+        return {'trials': len(per_trial), 'bytes': sum(per_trial.values()), 'max_bytes': self.max_bytes,
+                'per_trial': per_trial}
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_index(library_dir):
+    try:
+        with open(os.path.join(library_dir, 'index.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def library_is_current(library_dir, sources, params=None):
+    """
+    True if the library holds exactly `sources` ({name: path}) at their
+    current size and mtime, built with the same loader params.
+    """
+    index = _read_index(library_dir)
+    if index is None or index.get('version') != LIBRARY_VERSION or index.get('params') != params:
+        return False
+    try:
+        current = {name: _source_stat(path) for name, path in sources.items()}
+    except OSError:
+        return False
+    return index['sources'] == current
+
+
+def build_library(library_dir, sources, loader, params=None):
+    """
+    Write trials into one read-only library: every trial's float64 block is
+    appended to a single values.npy, and index.json records each trial's
+    offset, shape and columns plus the size/mtime of its source file.
+    Trials are always stored as float64 (one shared copy), so loader
+    settings such as a compact dtype belong in `params`.
+
+    Parameters:
+    library_dir (str): Library directory (replaced if it exists).
+    sources (dict): Trial name -> source file path.
+    loader (callable): name -> DataFrame of numeric columns.
+    params: JSON-serializable loader settings; a change triggers a rebuild.
+
+    Returns:
+    dict: The library index.
+    """
+    blocks, trials, offset = [], {}, 0
+    for name in sorted(sources):
+        df = loader(name)
+        values = df.to_numpy(dtype=np.float64)
+        trials[name] = {'offset': offset, 'shape': list(values.shape), 'columns': list(df.columns)}
+        blocks.append(values.ravel())
+        offset += values.size
+    index = {
+        'version': LIBRARY_VERSION,
+        'params': params,
+        'sources': {name: _source_stat(path) for name, path in sources.items()},
+        'trials': trials,
+    }
+    tmp = f"{library_dir.rstrip(os.sep)}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, 'values.npy'), np.concatenate(blocks) if blocks else np.empty(0), allow_pickle=False)
+    with open(os.path.join(tmp, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    # Processes still mapping the old values.npy keep their pages until they re-attach
+    shutil.rmtree(library_dir, ignore_errors=True)
+    os.replace(tmp, library_dir)
+    return index
+
+
+class SharedTrialLibrary:
+    """
+    Read-only trials served from a library written by build_library.
+
+    values.npy is memory-mapped, and every trial is a DataFrame view into
+    it, so nothing is copied. Processes attached to the same library share
+    one copy of the data through the OS page cache. Same get/prefetch/stats
+    interface as TrialStore.
+
+    Parameters:
+    library_dir (str): Library directory.
+    fallback (TrialStore): Serves trials missing from the library (e.g. files
+        added after it was built) and library trials evicted because their
+        source changed. Without one, unknown names raise KeyError.
+    """
+
+    def __init__(self, library_dir, fallback=None):
+        self.library_dir = library_dir
+        self.index = _read_index(library_dir)
+        if self.index is None:
+            raise FileNotFoundError(f"No trial library in {library_dir}")
+        self.fallback = fallback
+        self._values = np.load(os.path.join(library_dir, 'values.npy'), mmap_mode='r')
+        self._frames = {}
+        # Library trials whose source changed since the build; served by the fallback
+        self._stale = set()
+
+    @property
+    def nbytes(self):
+        return int(self._values.nbytes)
+
+    def __contains__(self, name):
+        return name in self.index['trials'] and name not in self._stale
+
+    def get(self, name):
+        df = self._frames.get(name)
+        if df is not None:
+            return df
+        entry = self.index['trials'].get(name)
+        if entry is None or name in self._stale:
+            if self.fallback is None:
+                raise KeyError(name)
+            return self.fallback.get(name)
+        rows, cols = entry['shape']
+        block = self._values[entry['offset']:entry['offset'] + rows * cols].reshape(rows, cols)
+        df = self._frames[name] = pd.DataFrame(block, columns=entry['columns'], copy=False)
+        return df
+
+    def prefetch(self, names):
+        # Library trials are already mapped; only fallback trials need loading
+        missing = [name for name in names if name not in self]
+        return self.fallback.prefetch(missing) if self.fallback is not None else []
+
+    def evict(self, name):
+        # The library itself is only rebuilt on the next start; until then a
+        # changed library trial is reloaded from its source by the fallback
+        if self.fallback is None:
+            return
+        if name in self.index['trials']:
+            self._stale.add(name)
+            self._frames.pop(name, None)
+        self.fallback.evict(name)
+
+    def stats(self):
+        itemsize = self._values.dtype.itemsize
+        per_trial = {name: entry['shape'][0] * entry['shape'][1] * itemsize
+                     for name, entry in self.index['trials'].items() if name not in self._stale}
+        return {'trials': len(per_trial), 'bytes': self.nbytes, 'max_bytes': None, 'shared': True,
+                'per_trial': per_trial}
+
+
+def open_library(library_dir, sources, loader, fallback=None, params=None):
+    """
+    Attach to the trial library in library_dir, building it first if it is
+    missing or any source changed. Builds hold an exclusive lock, so when
+    several workers start at once one parses and the rest wait and attach.
+
+    Parameters:
+    library_dir (str): Library directory.
+    sources (dict): Trial name -> source file path.
+    loader (callable): name -> DataFrame, used only when building.
+    fallback (TrialStore): See SharedTrialLibrary.
+    params: See build_library.
+
+    Returns:
+    SharedTrialLibrary
+    """
+    if not library_is_current(library_dir, sources, params):
+        parent = os.path.dirname(os.path.abspath(library_dir))
+        os.makedirs(parent, exist_ok=True)
+        with open(f"{library_dir.rstrip(os.sep)}.lock", 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have finished the build while we waited
+            if not library_is_current(library_dir, sources, params):
+                build_library(library_dir, sources, loader, params)
+    return SharedTrialLibrary(library_dir, fallback)
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+
+# Rows formatted per string operation; bounds the temporary text held at once
+WRITE_CHUNK_ROWS = 8192
+
+# Column formats: OpenSim writes .sto values right-aligned in 16 characters
+STO_FORMAT = '%16.8f'
+TRC_FORMAT = '%.5f'
+
+# Explanatory lines OpenSim puts before endheader
+STO_NOTES = [
+    "Units are S.I. units (second, meters, Newtons, ...)",
+    "If the header above contains a line with 'inDegrees', this indicates whether rotational values "
+    "are in degrees (yes) or radians (no).",
+]
+
+
+def format_block(values, formats, blank_nan=False):
+    """
+    Yield tab-separated text for a 2-D numeric block, WRITE_CHUNK_ROWS rows at
+    a time. Each chunk is one %-format of a repeated row template over the
+    flattened chunk, so the per-value work happens in C, not per row.
+
+    Parameters:
+    values (ndarray): Block shaped (rows, columns).
+    formats (str or list): %-format for every column, or one per column.
+    blank_nan (bool): Write NaN as an empty field (TRC gaps) instead of 'nan'.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim != 2:
+        raise ValueError(f"Expected a 2-D block, got shape {values.shape}")
+    if isinstance(formats, str):
+        formats = [formats] * values.shape[1]
+    row = '\t'.join(formats) + '\n'
+    for start in range(0, values.shape[0], WRITE_CHUNK_ROWS):
+        chunk = values[start:start + WRITE_CHUNK_ROWS]
+        text = (row * len(chunk)) % tuple(chunk.ravel().tolist())
+        if blank_nan:
+            text = text.replace('nan', '')
+        yield text
+
+
+def _write(path, lines, blocks):
+    # Write next to the target and rename, so readers never see a partial file
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w', newline='\n') as f:
+        f.write('\n'.join(lines) + '\n')
+        for text in blocks:
+            f.write(text)
+    os.replace(tmp, path)
+
+
+def write_sto(path, df, name='Coordinates', in_degrees=True):
+    """
+    Write a table as an OpenSim .sto file readable by sto_processing.read_sto.
+
+    Parameters:
+    path (str): Output file.
+    df (DataFrame): Numeric table with a 'time' column (moved first if needed).
+    name (str): Name on the first header line.
+    in_degrees (bool): Value of the inDegrees header field.
+    """
+    columns = ['time'] + [c for c in df.columns if c != 'time']
+    values = df[columns].to_numpy(dtype=np.float64)
+    lines = [
+        name,
+        "version=1",
+        f"nRows={values.shape[0]}",
+        f"nColumns={values.shape[1]}",
+        f"inDegrees={'yes' if in_degrees else 'no'}",
+        "",
+        *STO_NOTES,
+        "",
+        "endheader",
+        '\t'.join(str(c) for c in columns),
+    ]
+    _write(path, lines, format_block(values, STO_FORMAT))
+
+
+def write_trc(path, trial):
+    """
+    Write a TRCTrial as a .trc file readable by trc_reader.read_trc.
+    Missing samples (NaN) are written as empty fields.
+    """
+    n_frames, n_markers = trial.data.shape[:2]
+    header = {
+        'DataRate': trial.data_rate or 0.0,
+        'CameraRate': trial.header.get('CameraRate', trial.data_rate or 0.0),
+        'NumFrames': n_frames,
+        'NumMarkers': n_markers,
+        'Units': trial.units or 'mm',
+        'OrigDataRate': trial.header.get('OrigDataRate', trial.data_rate or 0.0),
+        'OrigDataStartFrame': trial.header.get('OrigDataStartFrame', 1),
+        'OrigNumFrames': trial.header.get('OrigNumFrames', n_frames),
+    }
+    lines = [
+        f"PathFileType\t4\t(X/Y/Z)\t{os.path.basename(path)}",
+        '\t'.join(header),
+        '\t'.join(str(v) for v in header.values()),
+        '\t'.join(['Frame#', 'Time'] + [f"{name}\t\t" for name in trial.marker_names]),
+        '\t'.join(['', ''] + [f"X{i}\tY{i}\tZ{i}" for i in range(1, n_markers + 1)]),
+    ]
+    values = np.column_stack([trial.frames, trial.time, np.asarray(trial.data).reshape(n_frames, -1)])
+    _write(path, lines, format_block(values, ['%d', '%.8f'] + [TRC_FORMAT] * (3 * n_markers), blank_nan=True))
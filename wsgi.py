@@ -0,0 +1,24 @@
+"""
+WSGI entry point for serving the dashboard with gunicorn.
+
+Trials are parsed once into the read-only trial library (TRIAL_LIBRARY,
+default .trial_library) and every worker memory-maps the same file, so
+adding workers adds processes, not copies of the data. With --preload the
+library is built and the app imported once in the master before forking;
+without it, the first worker builds the library and the others wait for it.
+Debug mode is never enabled here. Live mode (LIVE_TRC / LIVE_TRC_PORT) is
+refused: one file tail or socket cannot be shared by several workers, so run
+it with `python internal_sandbox.py` instead.
+
+Example:
+    gunicorn wsgi:server --preload --workers 4 --bind 0.0.0.0:8050
+"""
+import os
+
+os.environ.setdefault("TRIAL_LIBRARY", ".trial_library")
+if os.environ.get("LIVE_TRC") or os.environ.get("LIVE_TRC_PORT"):
+    raise RuntimeError("Live mode is not supported under wsgi; run internal_sandbox.py directly.")
+
+from internal_sandbox import app  # noqa: E402
+
+server = app.server